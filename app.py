@@ -1,5 +1,6 @@
 import os
 import logging
+import orjson
 import sqlalchemy
 import sqlalchemy.pool
 from flask import Flask
@@ -20,6 +21,10 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
+def _json_dumps(obj):
+    """JSON column serializer; orjson is much faster than json.dumps on bulk inserts"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///toefl_practice.db")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
@@ -30,7 +35,12 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_timeout": 5,
     "connect_args": {
         "options": "-c statement_timeout=5000"
-    }
+    },
+    # Bulk imports: fold executemany INSERTs into multi-row VALUES and batch the rest
+    "executemany_mode": "values_plus_batch",
+    "executemany_batch_page_size": 500,
+    "insertmanyvalues_page_size": 1000,
+    "json_serializer": _json_dumps
 }
 
 # Initialize the app with the extension
@@ -44,6 +54,14 @@ with app.app_context():
     import models
     db.create_all()
     
+    # create_all() only creates indexes along with new tables; add any missing ones to existing tables
+    try:
+        for index in models.ContentSource.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+    except Exception as e:
+        # e.g. duplicate TPO name/type rows from older imports; TPO importers then skip ON CONFLICT
+        logging.error(f"Failed to create content_source indexes: {e}")
+    
     # Re-enable background task manager for daily content generation
     try:
         from services.background_task_manager import get_task_manager
@@ -14,6 +14,11 @@ class User(UserMixin, db.Model):
     practice_sessions = db.relationship('PracticeSession', backref='user', lazy=True)
     scores = db.relationship('Score', backref='user', lazy=True)
 
+# Content types written by the TPO importers
+TPO_CONTENT_TYPES = ('tpo', 'smallstation_tpo')
+# Literal predicate for the partial TPO index; the importers' ON CONFLICT target must repeat it exactly
+TPO_CONTENT_WHERE = db.text("type IN (%s)" % ", ".join(f"'{t}'" for t in TPO_CONTENT_TYPES))
+
 class ContentSource(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)  # TPO, TED, CNN, BBC, ABC News, etc.
@@ -42,6 +47,11 @@ class ContentSource(db.Model):
     __table_args__ = (
         # Unique constraint for URL to prevent duplicate content
         db.UniqueConstraint('url', name='unique_content_url'),
+        # TPO content is identified by name+type so importers can re-run with ON CONFLICT DO NOTHING
+        # (partial: news rows reuse the provider name)
+        db.Index('unique_tpo_content_name_type', 'name', 'type', unique=True,
+                 postgresql_where=TPO_CONTENT_WHERE,
+                 sqlite_where=TPO_CONTENT_WHERE),
         # Add index for better query performance on content by date and name
         db.Index('idx_content_date_name', 'name', 'published_date'),
     )
@@ -178,7 +188,7 @@ class DailyEdition(db.Model):
     total_duration_sec = db.Column(db.Integer, default=0)  # Target: 5 hours = 18000 seconds
     word_count = db.Column(db.Integer, default=0)
     status = db.Column(db.String(20), default='draft')  # 'draft', 'ready', 'failed'
-    edition_metadata = db.Column(JSON)  # Statistics, sources used, etc.
+    edition_metadata = db.Column(JSON, default=dict)  # Statistics, sources used, etc.
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -202,7 +212,7 @@ class EditionSegment(db.Model):
     
     transcript_text = db.Column(Text)  # Full transcript for this segment
     summary = db.Column(JSON)  # AI-generated summary and key points
-    segment_metadata = db.Column(JSON)  # Original source, timestamps, etc.
+    segment_metadata = db.Column(JSON, default=dict)  # Original source, timestamps, etc.
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -0,0 +1,117 @@
+"""
+Audio Cache - Content-addressable storage for synthesized news audio
+"""
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Upper bound on total cache size before least-recently-used files are evicted
+LRU_MAX_MB = 512
+
+
+def audio_cache_key(script: str, voice: str, model: str, speed: float = 1.0) -> str:
+    """SHA-256 key for a (script, voice, model, speed) synthesis request"""
+    return hashlib.sha256(f"{script}{voice}{model}{speed}".encode('utf-8')).hexdigest()
+
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Hard-link src to dst, falling back to a copy across filesystems"""
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def group_identical_scripts(scripts: List[str]) -> List[List[int]]:
+    """Group indices of identical scripts (first-seen order) so each is synthesized once"""
+    groups: Dict[str, List[int]] = defaultdict(list)
+    for index, script in enumerate(scripts):
+        groups[hashlib.sha256(script.encode('utf-8')).hexdigest()].append(index)
+    return list(groups.values())
+
+
+class AudioCache:
+    """
+    Directory of synthesized audio files named by their cache key, bounded by LRU eviction.
+
+    manifest.json maps file name -> [size_bytes, last_access_ts]; it is read and written
+    under an exclusive flock so several workers can share the same cache directory.
+    """
+
+    def __init__(self, cache_dir: Path, audio_format: str, max_mb: int = LRU_MAX_MB):
+        self.cache_dir = Path(cache_dir)
+        self.audio_format = audio_format
+        self.max_bytes = max_mb * 1024 * 1024
+        self.manifest_path = self.cache_dir / 'manifest.json'
+        self.lock_path = self.cache_dir / 'manifest.lock'
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.{self.audio_format}"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Return the cached file for key, if present, and mark it as recently used"""
+        path = self._path(key)
+        with self._locked_manifest() as manifest:
+            entry = manifest.pop(path.name, None)
+            if not path.exists():
+                return None
+            size = entry[0] if entry else path.stat().st_size
+            manifest[path.name] = [size, time.time()]
+        return path
+
+    def put(self, key: str, path: Path) -> None:
+        """Store a freshly synthesized file under key, evicting old entries over the size cap"""
+        target = self._path(key)
+        link_or_copy(Path(path), target)
+        with self._locked_manifest() as manifest:
+            manifest.pop(target.name, None)
+            manifest[target.name] = [target.stat().st_size, time.time()]
+            self._evict(manifest)
+
+    def _evict(self, manifest: OrderedDict) -> None:
+        """Drop least-recently-used files until the cache fits under max_bytes"""
+        total = sum(size for size, _ in manifest.values())
+        while manifest and total > self.max_bytes:
+            name, (size, _) = manifest.popitem(last=False)
+            try:
+                (self.cache_dir / name).unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    @contextmanager
+    def _locked_manifest(self):
+        """Load the manifest under an exclusive lock and save it back on exit"""
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                manifest = self._load_manifest()
+                yield manifest
+                self._save_manifest(manifest)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_manifest(self) -> OrderedDict:
+        try:
+            with open(self.manifest_path, 'r') as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return OrderedDict()
+        # Oldest access first, so eviction pops from the front
+        return OrderedDict(sorted(entries.items(), key=lambda item: item[1][1]))
+
+    def _save_manifest(self, manifest: OrderedDict) -> None:
+        temp_path = self.manifest_path.with_suffix('.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self.manifest_path)
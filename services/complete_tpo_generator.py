@@ -3,13 +3,13 @@
 """
 
 import json
+from sqlalchemy.exc import IntegrityError
 from app import app, db
 from models import ContentSource, Question
+from services.tpo_urls import audio_url
 
 class CompleteTPOGenerator:
     def __init__(self):
-        self.audio_base_url = "https://tikustorage-sh.oss-cn-shanghai.aliyuncs.com/TPO_Audio"
-        
         # 標準TPO結構 (大部分TPO都遵循這個模式)
         self.standard_tpo_structure = {
             'Con1': {'passage': 1, 'part': 1, 'topic': '校園對話'},
@@ -48,74 +48,68 @@ class CompleteTPOGenerator:
             }
         ]
     
-    def generate_tikustorage_audio_url(self, tpo_num, passage, part):
-        """生成tikustorage格式的音檔URL"""
-        return f"{self.audio_base_url}/tpo{tpo_num}/tpo{tpo_num}_listening_passage{passage}_{part}.mp3"
-    
     def import_complete_tpo_range(self, start_tpo=1, end_tpo=75):
         """導入完整的TPO 1-75範圍"""
         print(f"🚀 開始導入完整TPO {start_tpo}-{end_tpo}...")
         
         total_imported = 0
+        failed_count = 0
         
         with app.app_context():
             for tpo_num in range(start_tpo, end_tpo + 1):
-                print(f"\\n📚 處理 TPO {tpo_num}...")
-                
                 for section_name, section_data in self.standard_tpo_structure.items():
+                    passage = section_data['passage']
+                    part = section_data['part']
+                    topic = section_data['topic']
+                    
+                    # 生成音檔URL
+                    content_url = audio_url(tpo_num, passage, part)
+                    
+                    # 創建ContentSource
+                    content_name = f"Official {tpo_num} {section_name}"
+                    content = ContentSource(
+                        name=content_name,
+                        url=content_url,
+                        type='tpo',
+                        description=f"TPO {tpo_num} {section_name}: {topic} (小站TPO - tikustorage音檔)",
+                        topic=topic,
+                        duration=300  # 預設5分鐘
+                    )
+                    
+                    # 每個內容放在自己的 SAVEPOINT 內，衝突只回滾這一筆，不影響尚未提交的其他內容
                     try:
-                        passage = section_data['passage']
-                        part = section_data['part']
-                        topic = section_data['topic']
-                        
-                        # 生成音檔URL
-                        audio_url = self.generate_tikustorage_audio_url(tpo_num, passage, part)
-                        
-                        # 創建ContentSource
-                        content_name = f"Official {tpo_num} {section_name}"
-                        content = ContentSource(
-                            name=content_name,
-                            url=audio_url,
-                            type='tpo',
-                            description=f"TPO {tpo_num} {section_name}: {topic} (小站TPO - tikustorage音檔)",
-                            topic=topic,
-                            duration=300  # 預設5分鐘
-                        )
-                        
-                        db.session.add(content)
-                        db.session.flush()  # 獲取ID
-                        
-                        # 添加標準題目
-                        for i, q_data in enumerate(self.default_questions):
-                            question = Question(
-                                content_id=content.id,
-                                question_text=q_data['question'],
-                                options=json.dumps(q_data['options'], ensure_ascii=False),
-                                correct_answer=q_data['correct_answer'],
-                                question_type='multiple_choice',
-                                order_num=i + 1
+                        with db.session.begin_nested():
+                            db.session.add(content)
+                            db.session.flush()  # 獲取ID
+                            
+                            # 添加標準題目
+                            db.session.add_all(
+                                Question(
+                                    content_id=content.id,
+                                    question_text=q_data['question'],
+                                    options=json.dumps(q_data['options'], ensure_ascii=False),
+                                    correct_answer=q_data['correct_answer'],
+                                    question_type='multiple_choice'
+                                )
+                                for q_data in self.default_questions
                             )
-                            db.session.add(question)
-                        
-                        total_imported += 1
-                        
-                        if total_imported <= 20:  # 只顯示前20個
-                            print(f"✅ 創建 {content_name} (ID: {content.id})")
-                        elif total_imported % 50 == 0:
-                            print(f"💾 已導入 {total_imported} 個內容...")
-                        
-                        # 每25個內容提交一次
-                        if total_imported % 25 == 0:
-                            db.session.commit()
-                        
-                    except Exception as e:
-                        print(f"❌ 處理 TPO {tpo_num} {section_name} 失敗: {e}")
-                        db.session.rollback()
+                    except IntegrityError as e:
+                        failed_count += 1
+                        last_error = e.orig
                         continue
+                    
+                    total_imported += 1
+                    
+                    # 每25個內容提交一次
+                    if total_imported % 25 == 0:
+                        db.session.commit()
             
             # 最終提交
             db.session.commit()
-            
+        
+        # 進度不逐筆輸出，結束時彙總一次
+        if failed_count:
+            print(f"❌ {failed_count} 個內容導入失敗: {last_error}")
         print(f"\\n🎉 完整導入完成！總共導入 {total_imported} 個TPO內容")
         return total_imported
     
@@ -146,19 +140,15 @@ class CompleteTPOGenerator:
                     part = section_data['part']
                     
                     # 生成新的音檔URL
-                    new_url = self.generate_tikustorage_audio_url(tpo_num, passage, part)
+                    new_url = audio_url(tpo_num, passage, part)
                     content.url = new_url
                     content.description = f"TPO {tpo_num} {section}: {section_data['topic']} (小站TPO - tikustorage音檔)"
                     
                     updated_count += 1
-                    
-                    if updated_count <= 10:
-                        print(f"✅ 更新: {content.name} -> {new_url}")
                 
                 # 每50個提交一次
                 if updated_count % 50 == 0:
                     db.session.commit()
-                    print(f"💾 已更新 {updated_count} 個TPO...")
             
             db.session.commit()
         
@@ -1,13 +1,50 @@
-import json
+import asyncio
 import logging
-import requests
 import random
-import re
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Optional
+import aiohttp
+import orjson
 from app import db
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Row
 from models import ContentSource, Question
 
+logger = logging.getLogger(__name__)
+
+# 題目順序對應題型（對話5題、講座6題）
+QTYPES_CONV = ('gist_purpose', 'detail', 'detail', 'function', 'function')
+QTYPES_LEC = ('gist_content', 'detail', 'detail', 'function', 'function', 'inference')
+
+class _AsyncRateLimiter:
+    """簡易非同步令牌桶：每 time_period 秒最多 max_rate 個請求"""
+    
+    def __init__(self, max_rate: float, time_period: float = 1.0):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = max_rate
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def __aenter__(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                refill = (now - self._last) * self.max_rate / self.time_period
+                self._tokens = min(self.max_rate, self._tokens + refill)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return self
+                await asyncio.sleep((1 - self._tokens) * self.time_period / self.max_rate)
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
 class KoolearnImportService:
     """
     新東方Koolearn官方TPO完整匯入服務
@@ -20,103 +57,210 @@ class KoolearnImportService:
     4. 支援題目的完整匯入和格式化
     """
     
-    def __init__(self):
-        self.logger = logging.getLogger(__name__)
-        
-        # Koolearn官方結構定義（基於實際網站數據）
-        self.koolearn_structure = {
-            # 官方TPO範圍分組
-            'official_ranges': {
-                '75-70': list(range(70, 76)),
-                '69-65': list(range(65, 70)),
-                '64-60': list(range(60, 65)),
-                '58-51': list(range(51, 59)),
-                '50-41': list(range(41, 51)),
-                '40-31': list(range(31, 41)),
-                '30-21': list(range(21, 31)),
-                '20-11': list(range(11, 21)),
-                '10-1': list(range(1, 11))
-            },
-            
-            # 難度標記對應
-            'difficulty_mapping': {
-                '易': 'easy',
-                '中': 'intermediate', 
-                '难': 'advanced'
-            },
-            
-            # 話題分類（從實際網站提取）
-            'topics': {
-                'conversations': [
-                    '志愿申请', '食宿', '其它咨询', '考试', '学术'
-                ],
-                'lectures': [
-                    '历史', '地球科学', '戏剧', '心理学', '动物', '环境科学',
-                    '天文学', '考古', '地质地理学', '美术', '文学', '植物'
-                ]
-            },
-            
-            # TPO部分結構（每個TPO固定5個部分）
-            'tpo_parts': [
-                {'name': 'Con1', 'type': 'conversation', 'questions': 5},
-                {'name': 'Con2', 'type': 'conversation', 'questions': 5},
-                {'name': 'Lec1', 'type': 'lecture', 'questions': 6},
-                {'name': 'Lec2', 'type': 'lecture', 'questions': 6},
-                {'name': 'Lec3', 'type': 'lecture', 'questions': 6}
+    # Koolearn官方結構定義（基於實際網站數據）
+    _KOOLEARN_STRUCTURE = {
+        # 官方TPO範圍分組
+        'official_ranges': {
+            '75-70': list(range(70, 76)),
+            '69-65': list(range(65, 70)),
+            '64-60': list(range(60, 65)),
+            '58-51': list(range(51, 59)),
+            '50-41': list(range(41, 51)),
+            '40-31': list(range(31, 41)),
+            '30-21': list(range(21, 31)),
+            '20-11': list(range(11, 21)),
+            '10-1': list(range(1, 11))
+        },
+        
+        # 難度標記對應
+        'difficulty_mapping': {
+            '易': 'easy',
+            '中': 'intermediate', 
+            '难': 'advanced'
+        },
+        
+        # 話題分類（從實際網站提取）
+        'topics': {
+            'conversations': [
+                '志愿申请', '食宿', '其它咨询', '考试', '学术'
             ],
-            
-            # 題型分類
-            'question_types': [
-                'gist_content', 'gist_purpose', 'detail', 
-                'function', 'attitude', 'inference', 'multiple_answer'
+            'lectures': [
+                '历史', '地球科学', '戏剧', '心理学', '动物', '环境科学',
+                '天文学', '考古', '地质地理学', '美术', '文学', '植物'
             ]
-        }
+        },
         
-        # 實際的Koolearn數據（從網站提取的真實數據）
-        self.official_data = {
-            75: {
-                'Con1': {'difficulty': '易', 'topic': '志愿申请', 'url_id': '1307-12130'},
-                'Lec1': {'difficulty': '中', 'topic': '历史', 'url_id': '1307-12132'},
-                'Lec2': {'difficulty': '难', 'topic': '地球科学', 'url_id': '1307-12133'},
-                'Con2': {'difficulty': '中', 'topic': '学术', 'url_id': '1307-12131'},
-                'Lec3': {'difficulty': '中', 'topic': '戏剧', 'url_id': '1307-12134'}
-            },
-            74: {
-                'Con1': {'difficulty': '易', 'topic': '食宿', 'url_id': '1306-12135'},
-                'Lec1': {'difficulty': '中', 'topic': '动物', 'url_id': '1306-12137'},
-                'Lec2': {'difficulty': '难', 'topic': '环境科学', 'url_id': '1306-12138'},
-                'Con2': {'difficulty': '中', 'topic': '学术', 'url_id': '1306-12136'},
-                'Lec3': {'difficulty': '难', 'topic': '历史', 'url_id': '1306-12139'}
-            },
-            73: {
-                'Con1': {'difficulty': '中', 'topic': '其它咨询', 'url_id': '1279-12056'},
-                'Lec1': {'difficulty': '易', 'topic': '心理学', 'url_id': '1279-12058'},
-                'Lec2': {'difficulty': '难', 'topic': '文学', 'url_id': '1279-12059'},
-                'Con2': {'difficulty': '中', 'topic': '其它咨询', 'url_id': '1279-12057'},
-                'Lec3': {'difficulty': '中', 'topic': '动物', 'url_id': '1279-12060'}
-            },
-            72: {
-                'Con1': {'difficulty': '难', 'topic': '学术', 'url_id': '1280-12051'},
-                'Lec1': {'difficulty': '中', 'topic': '植物', 'url_id': '1280-12053'},
-                'Lec2': {'difficulty': '中', 'topic': '植物', 'url_id': '1280-12054'},
-                'Con2': {'difficulty': '易', 'topic': '食宿', 'url_id': '1280-12052'},
-                'Lec3': {'difficulty': '中', 'topic': '心理学', 'url_id': '1280-12055'}
-            },
-            71: {
-                'Con1': {'difficulty': '易', 'topic': '其它咨询', 'url_id': '1281-12046'},
-                'Lec1': {'difficulty': '中', 'topic': '环境科学', 'url_id': '1281-12048'},
-                'Lec2': {'difficulty': '难', 'topic': '天文学', 'url_id': '1281-12049'},
-                'Con2': {'difficulty': '易', 'topic': '其它咨询', 'url_id': '1281-12047'},
-                'Lec3': {'difficulty': '难', 'topic': '考古', 'url_id': '1281-12050'}
-            },
-            70: {
-                'Con1': {'difficulty': '易', 'topic': '其它咨询', 'url_id': '1282-12041'},
-                'Lec1': {'difficulty': '中', 'topic': '动物', 'url_id': '1282-12043'},
-                'Lec2': {'difficulty': '难', 'topic': '天文学', 'url_id': '1282-12044'},
-                'Con2': {'difficulty': '中', 'topic': '志愿申请', 'url_id': '1282-12042'},
-                'Lec3': {'difficulty': '难', 'topic': '天文学', 'url_id': '1282-12045'}
-            }
+        # TPO部分結構（每個TPO固定5個部分）
+        'tpo_parts': [
+            {'name': 'Con1', 'type': 'conversation', 'questions': 5},
+            {'name': 'Con2', 'type': 'conversation', 'questions': 5},
+            {'name': 'Lec1', 'type': 'lecture', 'questions': 6},
+            {'name': 'Lec2', 'type': 'lecture', 'questions': 6},
+            {'name': 'Lec3', 'type': 'lecture', 'questions': 6}
+        ],
+        
+        # 題型分類
+        'question_types': [
+            'gist_content', 'gist_purpose', 'detail', 
+            'function', 'attitude', 'inference', 'multiple_answer'
+        ]
+    }
+    
+    # 實際的Koolearn數據（從網站提取的真實數據）
+    _OFFICIAL_DATA = {
+        75: {
+            'Con1': {'difficulty': '易', 'topic': '志愿申请', 'url_id': '1307-12130'},
+            'Lec1': {'difficulty': '中', 'topic': '历史', 'url_id': '1307-12132'},
+            'Lec2': {'difficulty': '难', 'topic': '地球科学', 'url_id': '1307-12133'},
+            'Con2': {'difficulty': '中', 'topic': '学术', 'url_id': '1307-12131'},
+            'Lec3': {'difficulty': '中', 'topic': '戏剧', 'url_id': '1307-12134'}
+        },
+        74: {
+            'Con1': {'difficulty': '易', 'topic': '食宿', 'url_id': '1306-12135'},
+            'Lec1': {'difficulty': '中', 'topic': '动物', 'url_id': '1306-12137'},
+            'Lec2': {'difficulty': '难', 'topic': '环境科学', 'url_id': '1306-12138'},
+            'Con2': {'difficulty': '中', 'topic': '学术', 'url_id': '1306-12136'},
+            'Lec3': {'difficulty': '难', 'topic': '历史', 'url_id': '1306-12139'}
+        },
+        73: {
+            'Con1': {'difficulty': '中', 'topic': '其它咨询', 'url_id': '1279-12056'},
+            'Lec1': {'difficulty': '易', 'topic': '心理学', 'url_id': '1279-12058'},
+            'Lec2': {'difficulty': '难', 'topic': '文学', 'url_id': '1279-12059'},
+            'Con2': {'difficulty': '中', 'topic': '其它咨询', 'url_id': '1279-12057'},
+            'Lec3': {'difficulty': '中', 'topic': '动物', 'url_id': '1279-12060'}
+        },
+        72: {
+            'Con1': {'difficulty': '难', 'topic': '学术', 'url_id': '1280-12051'},
+            'Lec1': {'difficulty': '中', 'topic': '植物', 'url_id': '1280-12053'},
+            'Lec2': {'difficulty': '中', 'topic': '植物', 'url_id': '1280-12054'},
+            'Con2': {'difficulty': '易', 'topic': '食宿', 'url_id': '1280-12052'},
+            'Lec3': {'difficulty': '中', 'topic': '心理学', 'url_id': '1280-12055'}
+        },
+        71: {
+            'Con1': {'difficulty': '易', 'topic': '其它咨询', 'url_id': '1281-12046'},
+            'Lec1': {'difficulty': '中', 'topic': '环境科学', 'url_id': '1281-12048'},
+            'Lec2': {'difficulty': '难', 'topic': '天文学', 'url_id': '1281-12049'},
+            'Con2': {'difficulty': '易', 'topic': '其它咨询', 'url_id': '1281-12047'},
+            'Lec3': {'difficulty': '难', 'topic': '考古', 'url_id': '1281-12050'}
+        },
+        70: {
+            'Con1': {'difficulty': '易', 'topic': '其它咨询', 'url_id': '1282-12041'},
+            'Lec1': {'difficulty': '中', 'topic': '动物', 'url_id': '1282-12043'},
+            'Lec2': {'difficulty': '难', 'topic': '天文学', 'url_id': '1282-12044'},
+            'Con2': {'difficulty': '中', 'topic': '志愿申请', 'url_id': '1282-12042'},
+            'Lec3': {'difficulty': '难', 'topic': '天文学', 'url_id': '1282-12045'}
         }
+    }
+    
+    # 預先建立話題元組，供隨機抽取使用
+    _CONV_TOPICS = tuple(_KOOLEARN_STRUCTURE['topics']['conversations'])
+    _LEC_TOPICS = tuple(_KOOLEARN_STRUCTURE['topics']['lectures'])
+    
+    # 所有官方範圍內的TPO編號（注意：59不在Koolearn範圍內）
+    _ALL_TPOS = frozenset().union(*_KOOLEARN_STRUCTURE['official_ranges'].values())
+    
+    # Koolearn頁面抓取設定
+    BASE_URL = "https://liuxue.koolearn.com/toefl/listen/"
+    FETCH_CONCURRENCY = 10
+    FETCH_TIMEOUT = 30
+    FETCH_MAX_RATE = 2  # 每秒最多請求數，避免被封鎖
+    FETCH_MAX_RETRIES = 5
+    
+    # 剩餘TPO資料生成的執行緒數
+    GENERATION_WORKERS = 4
+    
+    # 本地頁面快取（Koolearn TPO內容基本不會變動）
+    CACHE_PATH = 'koolearn_cache.sqlite'
+    CACHE_TTL = 86400 * 30
+    CACHE_QUERY_CHUNK = 500  # SQLite上限999個參數
+    
+    def __init__(self):
+        self.logger = logger
+    
+    def _page_url(self, url_id: str) -> str:
+        """組合Koolearn題目頁面網址"""
+        return f"{self.BASE_URL}{url_id}-q0.html"
+    
+    def fetch_koolearn_pages(self, urls: List[str]) -> Dict[str, Optional[str]]:
+        """並發抓取Koolearn頁面（同步入口），失敗的網址對應None"""
+        if not urls:
+            return {}
+        
+        cache = self._open_cache()
+        try:
+            pages = self._load_cached_pages(cache, urls)
+            missing = [url for url in urls if url not in pages]
+            
+            if missing:
+                fetched = asyncio.run(self._fetch_all(missing))
+                with cache:
+                    cache.executemany(
+                        "INSERT OR REPLACE INTO pages (url, body, fetched_at) VALUES (?, ?, ?)",
+                        [(url, body, time.time()) for url, body in fetched.items() if body is not None]
+                    )
+                pages.update(fetched)
+        finally:
+            cache.close()
+        
+        self.logger.info(f"Koolearn pages: {len(urls) - len(missing)} cached, {len(missing)} fetched")
+        return pages
+    
+    def _open_cache(self) -> sqlite3.Connection:
+        """開啟頁面快取資料庫"""
+        conn = sqlite3.connect(self.CACHE_PATH)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, body TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        return conn
+    
+    def _load_cached_pages(self, cache: sqlite3.Connection, urls: List[str]) -> Dict[str, Optional[str]]:
+        """讀取指定網址中未過期的快取頁面，分段以 IN 查詢，成本只隨請求的網址數增長"""
+        min_fetched_at = time.time() - self.CACHE_TTL
+        pages = {}
+        for start in range(0, len(urls), self.CACHE_QUERY_CHUNK):
+            chunk = urls[start:start + self.CACHE_QUERY_CHUNK]
+            pages.update(cache.execute(
+                "SELECT url, body FROM pages WHERE fetched_at >= ? AND url IN (%s)" % ", ".join("?" * len(chunk)),
+                (min_fetched_at, *chunk)
+            ))
+        return pages
+    
+    async def _fetch_all(self, urls: List[str]) -> Dict[str, Optional[str]]:
+        """共用單一ClientSession並以Semaphore限制並發數"""
+        
+        sem = asyncio.Semaphore(self.FETCH_CONCURRENCY)
+        limiter = _AsyncRateLimiter(self.FETCH_MAX_RATE, 1.0)
+        connector = aiohttp.TCPConnector(limit=self.FETCH_CONCURRENCY, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.FETCH_TIMEOUT)
+        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+        
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+            pages = await asyncio.gather(*[self._fetch_one(session, url, sem, limiter) for url in urls])
+        
+        return dict(zip(urls, pages))
+    
+    async def _fetch_one(self, session: aiohttp.ClientSession, url: str,
+                         sem: asyncio.Semaphore, limiter: _AsyncRateLimiter) -> Optional[str]:
+        """抓取單一頁面，遇到429時指數退避重試"""
+        
+        async with sem:
+            for attempt in range(self.FETCH_MAX_RETRIES):
+                try:
+                    async with limiter:
+                        async with session.get(url) as response:
+                            if response.status == 200:
+                                return await response.text()
+                            if response.status != 429:
+                                self.logger.warning(f"Koolearn page {url} returned {response.status}")
+                                return None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    self.logger.error(f"Error fetching {url}: {e}")
+                    return None
+                
+                await asyncio.sleep(2 ** attempt + random.random())
+            
+            self.logger.warning(f"Koolearn page {url} still rate limited after {self.FETCH_MAX_RETRIES} attempts")
+            return None
     
     def import_complete_koolearn_content(self) -> Dict:
         """匯入完整的Koolearn官方內容"""
@@ -134,8 +278,8 @@ class KoolearnImportService:
             
             # 先匯入有具體數據的TPO（75-70）
             for tpo_num in [75, 74, 73, 72, 71, 70]:
-                if tpo_num in self.official_data:
-                    result = self._import_single_tpo(tpo_num, self.official_data[tpo_num])
+                if tpo_num in self._OFFICIAL_DATA:
+                    result = self._import_single_tpo(tpo_num, self._OFFICIAL_DATA[tpo_num])
                     if result['success']:
                         stats['imported_tests'] += 1
                         stats['imported_parts'] += result['parts_created']
@@ -147,6 +291,9 @@ class KoolearnImportService:
             # 然後為其他TPO生成標準結構（69-1）
             self._import_remaining_tpos(stats)
             
+            # 整批匯入只提交一次
+            db.session.commit()
+            
             return {
                 'status': 'success',
                 'message': 'Koolearn content imported successfully',
@@ -156,6 +303,7 @@ class KoolearnImportService:
             
         except Exception as e:
             self.logger.error(f"Error importing Koolearn content: {e}")
+            db.session.rollback()
             return {
                 'status': 'error',
                 'message': str(e),
@@ -168,12 +316,14 @@ class KoolearnImportService:
         try:
             parts_created = 0
             questions_created = 0
+            parts = self._KOOLEARN_STRUCTURE['tpo_parts']
+            rng = None
             
-            # 按照標準順序處理每個部分
-            for part_info in self.koolearn_structure['tpo_parts']:
+            # 按照標準順序準備每個部分的內容源資料
+            part_rows = []
+            for index, part_info in enumerate(parts):
                 part_name = part_info['name']
                 part_type = part_info['type']
-                question_count = part_info['questions']
                 
                 if part_name in tpo_data:
                     # 使用真實的Koolearn數據
@@ -183,26 +333,35 @@ class KoolearnImportService:
                     url_id = real_data['url_id']
                 else:
                     # 生成標準數據
-                    difficulty_cn = random.choice(['易', '中', '难'])
+                    if rng is None:
+                        rng = random.Random(tpo_num)
+                    difficulty_cn = rng.choice(['易', '中', '难'])
                     if part_type == 'conversation':
-                        topic = random.choice(self.koolearn_structure['topics']['conversations'])
+                        topic = rng.choice(self._CONV_TOPICS)
                     else:
-                        topic = random.choice(self.koolearn_structure['topics']['lectures'])
-                    url_id = f"{1000 + tpo_num}-{12000 + parts_created}"
+                        topic = rng.choice(self._LEC_TOPICS)
+                    url_id = f"{1000 + tpo_num}-{12000 + index}"
                 
-                # 創建內容源
-                content_source = self._create_content_source(
+                part_rows.append(self._build_content_source_row(
                     tpo_num, part_name, part_type, difficulty_cn, topic, url_id
-                )
+                ))
+            
+            # 每個TPO使用savepoint，失敗時只回滾該TPO
+            with db.session.begin_nested():
+                # 一次寫入所有內容源並取回ID
+                content_sources = self._create_content_sources(part_rows)
                 
-                if content_source:
-                    # 創建題目
-                    created_questions = self._create_questions_for_part(
-                        content_source, question_count, part_type
-                    )
+                for part_info, row in zip(parts, part_rows):
+                    content_source = content_sources.get(row['name'])
                     
-                    questions_created += created_questions
-                    parts_created += 1
+                    if content_source:
+                        # 創建題目
+                        created_questions = self._create_questions_for_part(
+                            content_source, part_info['questions'], part_info['type']
+                        )
+                        
+                        questions_created += created_questions
+                        parts_created += 1
             
             return {
                 'success': True,
@@ -215,95 +374,73 @@ class KoolearnImportService:
             self.logger.error(f"Error importing TPO {tpo_num}: {e}")
             return {'success': False, 'error': str(e)}
     
-    def _create_content_source(self, tpo_num: int, part_name: str, part_type: str, 
-                              difficulty_cn: str, topic: str, url_id: str) -> Optional[ContentSource]:
-        """創建內容源記錄"""
+    def _build_content_source_row(self, tpo_num: int, part_name: str, part_type: str,
+                                  difficulty_cn: str, topic: str, url_id: str) -> Dict:
+        """組合內容源記錄欄位"""
         
-        try:
-            # 檢查是否已存在
-            existing = ContentSource.query.filter_by(
-                name=f"Official {tpo_num} {part_name}"
-            ).first()
-            
-            if existing:
-                return existing
-            
-            # 轉換難度標記
-            difficulty_en = self.koolearn_structure['difficulty_mapping'].get(difficulty_cn, 'intermediate')
-            
-            # 計算音頻時長（對話較短，講座較長）
-            duration = 180 if part_type == 'conversation' else 300
-            
-            content_source = ContentSource(
-                name=f"Official {tpo_num} {part_name}",
-                type='tpo',
-                url=f"https://liuxue.koolearn.com/toefl/listen/{url_id}-q0.html",
-                description=f"TPO {tpo_num} {part_type} on {topic} (Koolearn Official)",
-                topic=topic,
-                difficulty_level=difficulty_en,
-                duration=duration
+        # 轉換難度標記
+        difficulty_en = self._KOOLEARN_STRUCTURE['difficulty_mapping'].get(difficulty_cn, 'intermediate')
+        
+        # 計算音頻時長（對話較短，講座較長）
+        duration = 180 if part_type == 'conversation' else 300
+        
+        return {
+            'name': f"Official {tpo_num} {part_name}",
+            'type': 'tpo',
+            'url': self._page_url(url_id),
+            'description': f"TPO {tpo_num} {part_type} on {topic} (Koolearn Official)",
+            'topic': topic,
+            'difficulty_level': difficulty_en,
+            'duration': duration
+        }
+    
+    def _create_content_sources(self, rows: List[Dict]) -> Dict[str, Row]:
+        """批量創建內容源記錄，已存在的直接沿用，回傳 name -> (id, name, topic, difficulty_level)"""
+        
+        columns = (ContentSource.id, ContentSource.name, ContentSource.topic, ContentSource.difficulty_level)
+        
+        # 檢查是否已存在
+        names = [row['name'] for row in rows]
+        existing = {
+            r.name: r for r in db.session.execute(
+                select(*columns).where(ContentSource.name.in_(names))
             )
-            
-            db.session.add(content_source)
-            db.session.flush()  # 獲取ID
-            
-            return content_source
-            
-        except Exception as e:
-            self.logger.error(f"Error creating content source: {e}")
-            return None
+        }
+        
+        new_rows = [row for row in rows if row['name'] not in existing]
+        if new_rows:
+            # 單次往返寫入並取回ID
+            inserted = db.session.execute(insert(ContentSource).returning(*columns), new_rows)
+            existing.update({r.name: r for r in inserted})
+        
+        return existing
     
-    def _create_questions_for_part(self, content_source: ContentSource, 
+    def _create_questions_for_part(self, content_source: Row,
                                   question_count: int, part_type: str) -> int:
         """為特定部分創建題目"""
         
-        created_count = 0
+        # 根據題目順序和類型決定題型
+        seq = QTYPES_CONV if part_type == 'conversation' else QTYPES_LEC
         
-        for q_num in range(1, question_count + 1):
-            try:
-                # 根據題目順序和類型決定題型
-                if q_num == 1:
-                    if part_type == 'conversation':
-                        q_type = 'gist_purpose'
-                    else:
-                        q_type = 'gist_content'
-                elif q_num <= 3:
-                    q_type = 'detail'
-                elif q_num <= 5:
-                    q_type = 'function'
-                else:
-                    q_type = 'inference'
-                
-                # 生成題目內容
-                question_text = self._generate_question_text(content_source.topic, q_type, part_type)
-                options = self._generate_options(content_source.topic, q_type)
-                
-                question = Question(
-                    content_id=content_source.id,
-                    question_text=question_text,
-                    question_type=q_type,
-                    options=json.dumps(options),
-                    correct_answer=options[0],  # 第一個選項為正確答案
-                    explanation=f"This question tests {q_type} understanding in {part_type} context.",
-                    difficulty=content_source.difficulty_level,
-                    audio_timestamp=q_num * 30.0
-                )
-                
-                db.session.add(question)
-                created_count += 1
-                
-            except Exception as e:
-                self.logger.error(f"Error creating question {q_num}: {e}")
-                continue
-        
-        try:
-            db.session.commit()
-        except Exception as e:
-            self.logger.error(f"Error committing questions: {e}")
-            db.session.rollback()
-            return 0
+        question_rows = []
+        for q_num, q_type in enumerate(seq[:question_count], start=1):
+            # 生成題目內容
+            question_text = self._generate_question_text(content_source.topic, q_type, part_type)
+            options = self._generate_options(content_source.topic, q_type)
+            
+            question_rows.append({
+                'content_id': content_source.id,
+                'question_text': question_text,
+                'question_type': q_type,
+                'options': orjson.dumps(options).decode(),
+                'correct_answer': options[0],  # 第一個選項為正確答案
+                'explanation': f"This question tests {q_type} understanding in {part_type} context.",
+                'difficulty': content_source.difficulty_level,
+                'audio_timestamp': q_num * 30.0
+            })
         
-        return created_count
+        db.session.execute(insert(Question), question_rows)
+        return len(question_rows)
     
     def _generate_question_text(self, topic: str, q_type: str, part_type: str) -> str:
         """生成題目文本"""
@@ -355,18 +492,25 @@ class KoolearnImportService:
     def _import_remaining_tpos(self, stats: Dict):
         """匯入剩餘的TPO（69-1）"""
         
-        remaining_tpos = []
-        for range_name, tpo_list in self.koolearn_structure['official_ranges'].items():
-            for tpo_num in tpo_list:
-                if tpo_num not in self.official_data:  # 跳過已有具體數據的
-                    remaining_tpos.append(tpo_num)
+        # 跳過已有具體數據的，並限制匯入數量以避免過多數據
+        remaining_tpos = sorted(self._ALL_TPOS - self._OFFICIAL_DATA.keys(), reverse=True)[:10]  # 匯入前10個
         
-        # 限制匯入數量以避免過多數據
-        remaining_tpos = sorted(remaining_tpos, reverse=True)[:10]  # 匯入前10個
+        # 跳過所有部分都已存在的TPO，避免重複生成和寫入
+        parts = self._KOOLEARN_STRUCTURE['tpo_parts']
+        existing_names = self._get_existing_tpo_names()
+        remaining_tpos = [
+            tpo_num for tpo_num in remaining_tpos
+            if sum(1 for p in parts if f"Official {tpo_num} {p['name']}" in existing_names) < len(parts)
+        ]
+        if not remaining_tpos:
+            self.logger.info("All remaining TPOs already imported, skipping")
+            return
         
-        for tpo_num in remaining_tpos:
-            # 生成標準結構
-            generated_data = self._generate_tpo_data(tpo_num)
+        # 並行生成標準結構（純計算、各TPO獨立），資料庫寫入仍依序進行
+        with ThreadPoolExecutor(max_workers=self.GENERATION_WORKERS) as executor:
+            generated = list(executor.map(self._generate_tpo_data, remaining_tpos))
+        
+        for tpo_num, generated_data in zip(remaining_tpos, generated):
             result = self._import_single_tpo(tpo_num, generated_data)
             
             if result['success']:
@@ -377,21 +521,37 @@ class KoolearnImportService:
             else:
                 stats['failed_imports'] += 1
     
-    def _generate_tpo_data(self, tpo_num: int) -> Dict:
-        """為TPO生成標準數據結構"""
+    def _get_existing_tpo_names(self) -> set:
+        """一次查詢取得所有已存在的Official TPO名稱"""
+        return set(db.session.execute(
+            select(ContentSource.name).where(ContentSource.name.like('Official %'))
+        ).scalars())
+    
+    def _generate_tpo_data(self, tpo_num: int, rng: Optional[random.Random] = None) -> Dict:
+        """為TPO生成標準數據結構（預設以TPO編號為種子，結果可重現）"""
+        
+        if rng is None:
+            rng = random.Random(tpo_num)
+        
+        # 一次性批量抽取該TPO所有部分的難度和話題
+        parts = self._KOOLEARN_STRUCTURE['tpo_parts']
+        conv_count = sum(1 for p in parts if p['type'] == 'conversation')
+        difficulties = iter(rng.choices(['易', '中', '难'], k=len(parts)))
+        conv_topics = iter(rng.choices(self._CONV_TOPICS, k=conv_count))
+        lec_topics = iter(rng.choices(self._LEC_TOPICS, k=len(parts) - conv_count))
         
         data = {}
         
-        for part_info in self.koolearn_structure['tpo_parts']:
+        for part_info in parts:
             part_name = part_info['name']
             part_type = part_info['type']
             
             # 隨機選擇難度和話題
-            difficulty = random.choice(['易', '中', '难'])
+            difficulty = next(difficulties)
             if part_type == 'conversation':
-                topic = random.choice(self.koolearn_structure['topics']['conversations'])
+                topic = next(conv_topics)
             else:
-                topic = random.choice(self.koolearn_structure['topics']['lectures'])
+                topic = next(lec_topics)
             
             data[part_name] = {
                 'difficulty': difficulty,
@@ -404,24 +564,36 @@ class KoolearnImportService:
     def get_import_summary(self) -> Dict:
         """獲取匯入摘要"""
         
-        tpo_count = ContentSource.query.filter_by(type='tpo').count()
         question_count = Question.query.join(ContentSource).filter(
             ContentSource.type == 'tpo'
         ).count()
         
-        # 按TPO分組統計
-        tpo_groups = {}
-        all_tpo = ContentSource.query.filter_by(type='tpo').all()
+        # 只取名稱欄位，避免載入完整ORM物件
+        tpo_names = db.session.execute(
+            select(ContentSource.name).where(ContentSource.type == 'tpo')
+        ).scalars().all()
+        tpo_count = len(tpo_names)
         
-        for content in all_tpo:
-            tpo_match = re.search(r'Official (\\d+)', content.name)
-            if tpo_match:
-                tpo_num = int(tpo_match.group(1))
-                if tpo_num not in tpo_groups:
-                    tpo_groups[tpo_num] = []
-                tpo_groups[tpo_num].append(content)
+        # 按TPO分組統計（只需各TPO的部分數量）
+        tpo_groups = defaultdict(int)
+        lo = hi = None
         
-        tpo_range = f"{min(tpo_groups.keys())}-{max(tpo_groups.keys())}" if tpo_groups else "None"
+        for name in tpo_names:
+            # 名稱格式固定為 "Official {tpo_num} {part_name}"
+            try:
+                prefix, tpo_str, _ = name.split(' ', 2)
+                if prefix != 'Official':
+                    continue
+                tpo_num = int(tpo_str)
+            except ValueError:
+                continue
+            tpo_groups[tpo_num] += 1
+            if lo is None or tpo_num < lo:
+                lo = tpo_num
+            if hi is None or tpo_num > hi:
+                hi = tpo_num
+        
+        tpo_range = f"{lo}-{hi}" if tpo_groups else "None"
         
         return {
             'total_tpo_tests': len(tpo_groups),
@@ -429,5 +601,5 @@ class KoolearnImportService:
             'total_questions': question_count,
             'tpo_range': tpo_range,
             'questions_per_tpo': question_count / len(tpo_groups) if tpo_groups else 0,
-            'structure_valid': all(len(parts) == 5 for parts in tpo_groups.values())
-        }\n                \n                # 創建內容源\n                content_source = self._create_content_source(\n                    tpo_num, part_name, part_type, difficulty_cn, topic, url_id\n                )\n                \n                if content_source:\n                    # 創建題目\n                    created_questions = self._create_questions_for_part(\n                        content_source, question_count, part_type\n                    )\n                    \n                    questions_created += created_questions\n                    parts_created += 1\n            \n            return {\n                'success': True,\n                'tpo_number': tpo_num,\n                'parts_created': parts_created,\n                'questions_created': questions_created\n            }\n            \n        except Exception as e:\n            self.logger.error(f\"Error importing TPO {tpo_num}: {e}\")\n            return {'success': False, 'error': str(e)}\n    \n    def _create_content_source(self, tpo_num: int, part_name: str, part_type: str, \n                              difficulty_cn: str, topic: str, url_id: str) -> Optional[ContentSource]:\n        \"\"\"創建內容源記錄\"\"\"\n        \n        try:\n            # 檢查是否已存在\n            existing = ContentSource.query.filter_by(\n                name=f\"Official {tpo_num} {part_name}\"\n            ).first()\n            \n            if existing:\n                return existing\n            \n            # 轉換難度標記\n            difficulty_en = self.koolearn_structure['difficulty_mapping'].get(difficulty_cn, 'intermediate')\n            \n            # 計算音頻時長（對話較短，講座較長）\n            duration = 180 if part_type == 'conversation' else 300\n            \n            content_source = ContentSource(\n                name=f\"Official {tpo_num} {part_name}\",\n                type='tpo',\n                url=f\"https://liuxue.koolearn.com/toefl/listen/{url_id}-q0.html\",\n                description=f\"TPO {tpo_num} {part_type} on {topic} (Koolearn Official)\",\n                topic=topic,\n                difficulty_level=difficulty_en,\n                duration=duration\n            )\n            \n            db.session.add(content_source)\n            db.session.flush()  # 獲取ID\n            \n            return content_source\n            \n        except Exception as e:\n            self.logger.error(f\"Error creating content source: {e}\")\n            return None\n    \n    def _create_questions_for_part(self, content_source: ContentSource, \n                                  question_count: int, part_type: str) -> int:\n        \"\"\"為特定部分創建題目\"\"\"\n        \n        created_count = 0\n        \n        for q_num in range(1, question_count + 1):\n            try:\n                # 根據題目順序和類型決定題型\n                if q_num == 1:\n                    if part_type == 'conversation':\n                        q_type = 'gist_purpose'\n                    else:\n                        q_type = 'gist_content'\n                elif q_num <= 3:\n                    q_type = 'detail'\n                elif q_num <= 5:\n                    q_type = 'function'\n                else:\n                    q_type = 'inference'\n                \n                # 生成題目內容\n                question_text = self._generate_question_text(content_source.topic, q_type, part_type)\n                options = self._generate_options(content_source.topic, q_type)\n                \n                question = Question(\n                    content_id=content_source.id,\n                    question_text=question_text,\n                    question_type=q_type,\n                    options=json.dumps(options),\n                    correct_answer=options[0],  # 第一個選項為正確答案\n                    explanation=f\"This question tests {q_type} understanding in {part_type} context.\",\n                    difficulty=content_source.difficulty_level,\n                    audio_timestamp=q_num * 30.0\n                )\n                \n                db.session.add(question)\n                created_count += 1\n                \n            except Exception as e:\n                self.logger.error(f\"Error creating question {q_num}: {e}\")\n                continue\n        \n        try:\n            db.session.commit()\n        except Exception as e:\n            self.logger.error(f\"Error committing questions: {e}\")\n            db.session.rollback()\n            return 0\n        \n        return created_count\n    \n    def _generate_question_text(self, topic: str, q_type: str, part_type: str) -> str:\n        \"\"\"生成題目文本\"\"\"\n        \n        templates = {\n            'gist_content': f\"What is the main topic of this {part_type} about {topic}?\",\n            'gist_purpose': f\"What is the main purpose of this {part_type}?\",\n            'detail': f\"According to the {part_type}, what specific information is mentioned about {topic}?\",\n            'function': f\"Why does the speaker mention {topic} in this context?\",\n            'attitude': f\"What is the speaker's attitude toward {topic}?\",\n            'inference': f\"What can be inferred about {topic} from this {part_type}?\"\n        }\n        \n        return templates.get(q_type, f\"What does the {part_type} discuss about {topic}?\")\n    \n    def _generate_options(self, topic: str, q_type: str) -> List[str]:\n        \"\"\"生成選項\"\"\"\n        \n        option_templates = {\n            'gist_content': [\n                f\"The fundamental principles and concepts of {topic}\",\n                f\"Historical development and evolution of {topic}\", \n                f\"Current research methods and approaches in {topic}\",\n                f\"Practical applications and real-world uses of {topic}\"\n            ],\n            'gist_purpose': [\n                f\"To get assistance with {topic}-related issues\",\n                f\"To ask questions about course requirements\",\n                f\"To discuss research opportunities\", \n                f\"To resolve academic problems\"\n            ],\n            'detail': [\n                f\"Specific characteristics and features of {topic}\",\n                f\"Important dates and timeline information\",\n                f\"Key figures and their contributions\",\n                f\"Technical specifications and details\"\n            ]\n        }\n        \n        options = option_templates.get(q_type, [\n            f\"Option A about {topic}\",\n            f\"Option B about {topic}\", \n            f\"Option C about {topic}\",\n            f\"Option D about {topic}\"\n        ])\n        \n        return options\n    \n    def _import_remaining_tpos(self, stats: Dict):\n        \"\"\"匯入剩餘的TPO（69-1）\"\"\"\n        \n        remaining_tpos = []\n        for range_name, tpo_list in self.koolearn_structure['official_ranges'].items():\n            for tpo_num in tpo_list:\n                if tpo_num not in self.official_data:  # 跳過已有具體數據的\n                    remaining_tpos.append(tpo_num)\n        \n        # 限制匯入數量以避免過多數據\n        remaining_tpos = sorted(remaining_tpos, reverse=True)[:10]  # 匯入前10個\n        \n        for tpo_num in remaining_tpos:\n            # 生成標準結構\n            generated_data = self._generate_tpo_data(tpo_num)\n            result = self._import_single_tpo(tpo_num, generated_data)\n            \n            if result['success']:\n                stats['imported_tests'] += 1\n                stats['imported_parts'] += result['parts_created']\n                stats['imported_questions'] += result['questions_created']\n                stats['import_details'][f'Official {tpo_num}'] = result\n            else:\n                stats['failed_imports'] += 1\n    \n    def _generate_tpo_data(self, tpo_num: int) -> Dict:\n        \"\"\"為TPO生成標準數據結構\"\"\"\n        \n        data = {}\n        \n        for part_info in self.koolearn_structure['tpo_parts']:\n            part_name = part_info['name']\n            part_type = part_info['type']\n            \n            # 隨機選擇難度和話題\n            difficulty = random.choice(['易', '中', '难'])\n            if part_type == 'conversation':\n                topic = random.choice(self.koolearn_structure['topics']['conversations'])\n            else:\n                topic = random.choice(self.koolearn_structure['topics']['lectures'])\n            \n            data[part_name] = {\n                'difficulty': difficulty,\n                'topic': topic,\n                'url_id': f\"{1000 + tpo_num}-{12000 + len(data)}\"\n            }\n        \n        return data\n    \n    def get_import_summary(self) -> Dict:\n        \"\"\"獲取匯入摘要\"\"\"\n        \n        tpo_count = ContentSource.query.filter_by(type='tpo').count()\n        question_count = Question.query.join(ContentSource).filter(\n            ContentSource.type == 'tpo'\n        ).count()\n        \n        # 按TPO分組統計\n        tpo_groups = {}\n        all_tpo = ContentSource.query.filter_by(type='tpo').all()\n        \n        for content in all_tpo:\n            tpo_match = re.search(r'Official (\\d+)', content.name)\n            if tpo_match:\n                tpo_num = int(tpo_match.group(1))\n                if tpo_num not in tpo_groups:\n                    tpo_groups[tpo_num] = []\n                tpo_groups[tpo_num].append(content)\n        \n        return {\n            'total_tpo_tests': len(tpo_groups),\n            'total_tpo_parts': tpo_count,\n            'total_questions': question_count,\n            'tpo_range': f\"{min(tpo_groups.keys())}-{max(tpo_groups.keys())}\" if tpo_groups else \"None\",\n            'questions_per_tpo': question_count / len(tpo_groups) if tpo_groups else 0,\n            'structure_valid': all(len(parts) == 5 for parts in tpo_groups.values())\n        }
\ No newline at end of file
+            'structure_valid': all(part_count == 5 for part_count in tpo_groups.values())
+        }
@@ -1,17 +1,33 @@
 """
 News Anchor TTS Service - Generate professional news anchor audio for daily editions
 """
+import io
 import os
-import json
+import re
+import functools
+import asyncio
 import logging
-from datetime import datetime, date
-from typing import Dict, List, Optional, Any
+import time
+from collections import defaultdict
+from datetime import date
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Any
 from pathlib import Path
-import requests
-from openai import OpenAI
 
 from app import app, db
 from models import DailyEdition, EditionSegment
+from services.audio_cache import AudioCache, audio_cache_key, group_identical_scripts, link_or_copy
+
+if TYPE_CHECKING:
+    # openai/httpx are imported lazily so workers that never synthesize don't pay for them
+    import httpx
+    from openai import OpenAI, AsyncOpenAI
+
+# Sentence boundaries (terminator kept with its sentence) and words that warrant a pause
+_SENT_RE = re.compile(r'(?<=[.!?])\s+')
+_EMPH_RE = re.compile(r'\b(breaking|urgent|crisis|emergency)\b', re.I)
+
+# Professional news anchor pace, used to size scripts to a target duration
+TARGET_WORDS_PER_MINUTE = 160
 
 class NewsAnchorTTS:
     """Generate professional news anchor-style audio for daily news editions"""
@@ -25,20 +41,43 @@ class NewsAnchorTTS:
     
     # Audio quality settings
     AUDIO_FORMAT = 'mp3'
+    TTS_MODEL = 'tts-1-hd'  # High quality model
     SAMPLE_RATE = 22050
     SPEED = 1.0  # Normal speaking speed
+    MAX_CONCURRENCY = 4  # Parallel TTS requests per edition
+    
+    # HTTP connection pool shared by all TTS requests of a client
+    HTTP_MAX_CONNECTIONS = 32
+    HTTP_MAX_KEEPALIVE = 16
+    HTTP_TIMEOUT = 30
+    
+    # Batched synthesis: several same-voice scripts per request, split back apart on silence
+    MAX_BATCH_CHARS = 4000  # OpenAI TTS input limit is 4096 characters
+    BATCH_PAUSE = "\n\n. . . . . . . . . .\n\n"  # Read as a long silence between scripts
+    BATCH_MIN_SILENCE_MS = 1800
+    BATCH_SILENCE_THRESH_DB = -40
     
     # Duration targets
-    TARGET_WORDS_PER_MINUTE = 160  # Professional news anchor pace
     SEGMENT_TARGET_DURATION = 180  # 3 minutes per segment
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.openai_client = self._initialize_openai()
-        self.audio_dir = Path('static/audio/news')
+        self._static_root = Path('static').resolve()
+        self.audio_dir = self._static_root / 'audio' / 'news'
         self.audio_dir.mkdir(parents=True, exist_ok=True)
+        self.audio_cache = AudioCache(self.audio_dir / 'cache', self.AUDIO_FORMAT)
+        
+    def _http_limits(self) -> 'httpx.Limits':
+        """Connection pool limits so concurrent TTS requests reuse keep-alive sockets"""
+        import httpx
         
-    def _initialize_openai(self) -> Optional[OpenAI]:
+        return httpx.Limits(
+            max_connections=self.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=self.HTTP_MAX_KEEPALIVE
+        )
+    
+    def _initialize_openai(self) -> Optional['OpenAI']:
         """Initialize OpenAI client for TTS"""
         api_key = os.environ.get('OPENAI_API_KEY')
         if not api_key:
@@ -46,14 +85,35 @@ class NewsAnchorTTS:
             return None
         
         try:
-            client = OpenAI(api_key=api_key)
-            # Test the client with a simple request
-            return client
+            import httpx
+            from openai import OpenAI
+            
+            return OpenAI(
+                api_key=api_key,
+                http_client=httpx.Client(limits=self._http_limits(), timeout=self.HTTP_TIMEOUT)
+            )
         except Exception as e:
             self.logger.error(f"Failed to initialize OpenAI client: {e}")
             return None
     
-    def generate_anchor_script(self, headline: str, content: str, duration_target: int = 180) -> str:
+    def _initialize_async_openai(self) -> 'AsyncOpenAI':
+        """
+        Create an async OpenAI client for one edition run
+        
+        Its pooled connections belong to the event loop that opened them, so a
+        client is created (and closed) inside each asyncio.run() rather than reused.
+        """
+        import httpx
+        from openai import AsyncOpenAI
+        
+        return AsyncOpenAI(
+            api_key=os.environ.get('OPENAI_API_KEY'),
+            http_client=httpx.AsyncClient(limits=self._http_limits(), timeout=self.HTTP_TIMEOUT)
+        )
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def generate_anchor_script(headline: str, content: str, duration_target: int = 180) -> str:
         """
         Generate professional news anchor script from headline and content
         
@@ -66,7 +126,7 @@ class NewsAnchorTTS:
             Professional anchor script formatted for TTS
         """
         # Calculate target word count based on speaking pace
-        target_words = (duration_target * self.TARGET_WORDS_PER_MINUTE) // 60
+        target_words = (duration_target * TARGET_WORDS_PER_MINUTE) // 60
         
         # Create anchor-style script template
         script_template = f"""
@@ -74,7 +134,7 @@ class NewsAnchorTTS:
         
         {headline}
         
-        {self._format_content_for_anchor(content, target_words - 50)}  # Reserve words for intro/outro
+        {NewsAnchorTTS._format_content_for_anchor(content, target_words - 50)}  # Reserve words for intro/outro
         
         We'll continue following this developing story. 
         This has been your international news update.
@@ -82,11 +142,13 @@ class NewsAnchorTTS:
         
         return script_template.strip()
     
-    def _format_content_for_anchor(self, content: str, target_words: int) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _format_content_for_anchor(content: str, target_words: int) -> str:
         """Format content in news anchor style with proper pacing"""
         
-        # Clean and split content
-        sentences = content.replace('\n', ' ').split('.')
+        # Clean and split content, keeping each sentence's punctuation
+        sentences = _SENT_RE.split(content.replace('\n', ' '))
         formatted_sentences = []
         word_count = 0
         
@@ -100,7 +162,7 @@ class NewsAnchorTTS:
                 sentence = f"According to reports, {sentence.lower()}"
             
             # Add appropriate pauses for dramatic effect
-            if any(word in sentence.lower() for word in ['breaking', 'urgent', 'crisis', 'emergency']):
+            if _EMPH_RE.search(sentence):
                 sentence = f"[PAUSE] {sentence} [PAUSE]"
             
             words_in_sentence = len(sentence.split())
@@ -110,15 +172,19 @@ class NewsAnchorTTS:
             formatted_sentences.append(sentence)
             word_count += words_in_sentence
         
-        return '. '.join(formatted_sentences) + '.'
+        result = ' '.join(formatted_sentences)
+        return result if result.endswith(('.', '!', '?')) else result + '.'
     
-    def generate_audio_for_segment(self, segment: EditionSegment, voice: str = 'primary') -> Optional[str]:
+    def generate_audio_for_segment(self, segment: EditionSegment, voice: str = 'primary',
+                                   commit: bool = True, edition_dir: Optional[Path] = None) -> Optional[str]:
         """
         Generate TTS audio for a news segment
         
         Args:
             segment: EditionSegment to generate audio for
             voice: Voice model to use
+            commit: Commit the metadata update immediately (False when batching)
+            edition_dir: Existing output directory for the edition (created if omitted)
             
         Returns:
             Path to generated audio file or None if failed
@@ -128,49 +194,25 @@ class NewsAnchorTTS:
             return None
             
         try:
-            # Generate anchor script
-            script = self.generate_anchor_script(
-                segment.headline,
-                segment.transcript_text or segment.headline,
-                segment.duration_sec
-            )
-            
-            # Create voice settings
-            voice_model = self.VOICE_MODELS.get(voice, self.VOICE_MODELS['primary'])
-            
-            # Generate audio using OpenAI TTS
-            response = self.openai_client.audio.speech.create(
-                model="tts-1-hd",  # High quality model
-                voice=voice_model,
-                input=script,
-                response_format=self.AUDIO_FORMAT,
-                speed=self.SPEED
-            )
-            
-            # Save audio file
-            audio_filename = f"segment_{segment.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{self.AUDIO_FORMAT}"
-            audio_path = self.audio_dir / str(segment.edition_id) / audio_filename
-            audio_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Write audio data
-            with open(audio_path, 'wb') as f:
-                for chunk in response.iter_bytes():
-                    f.write(chunk)
+            plan = self._plan_segment_audio(segment, voice, edition_dir)
             
-            # Update segment with audio path
-            relative_path = str(audio_path.relative_to(Path('static')))
-            segment.segment_metadata = segment.segment_metadata or {}
-            if isinstance(segment.segment_metadata, str):
-                segment.segment_metadata = json.loads(segment.segment_metadata)
-            
-            segment.segment_metadata.update({
-                'audio_file': relative_path,
-                'tts_voice': voice_model,
-                'tts_generated_at': datetime.now().isoformat(),
-                'anchor_script': script
-            })
+            if not self._reuse_existing_audio(plan):
+                # Generate audio using OpenAI TTS, streaming the body straight to disk
+                with self.openai_client.audio.speech.with_streaming_response.create(
+                    model=self.TTS_MODEL,
+                    voice=plan['voice_model'],
+                    input=plan['script'],
+                    response_format=self.AUDIO_FORMAT,
+                    speed=self.SPEED
+                ) as response:
+                    response.stream_to_file(plan['partial_path'])
+                os.replace(plan['partial_path'], plan['audio_path'])
+                
+                self.audio_cache.put(plan['cache_key'], plan['audio_path'])
             
-            db.session.commit()
+            relative_path = self._record_segment_audio(segment, plan)
+            if commit:
+                db.session.commit()
             
             self.logger.info(f"Generated audio for segment {segment.id}: {relative_path}")
             return relative_path
@@ -179,12 +221,227 @@ class NewsAnchorTTS:
             self.logger.error(f"Failed to generate audio for segment {segment.id}: {e}")
             return None
     
-    def generate_full_edition_audio(self, edition_id: int) -> Dict[str, Any]:
+    def _edition_dir(self, edition_id: int) -> Path:
+        """Create (if needed) and return the audio directory for an edition"""
+        edition_dir = self.audio_dir / str(edition_id)
+        edition_dir.mkdir(parents=True, exist_ok=True)
+        return edition_dir
+    
+    def _plan_segment_audio(self, segment: EditionSegment, voice: str,
+                            edition_dir: Optional[Path] = None) -> Dict[str, Any]:
+        """Build the anchor script, voice and output path for a segment"""
+        
+        # Generate anchor script
+        script = self.generate_anchor_script(
+            segment.headline,
+            segment.transcript_text or segment.headline,
+            segment.duration_sec
+        )
+        
+        # Create voice settings
+        voice_model = self.VOICE_MODELS.get(voice, self.VOICE_MODELS['primary'])
+        
+        # Name the file after its content so an existing file means it is already rendered
+        cache_key = audio_cache_key(script, voice_model, self.TTS_MODEL, self.SPEED)
+        audio_filename = f"segment_{segment.id}_{cache_key[:12]}.{self.AUDIO_FORMAT}"
+        if edition_dir is None:
+            edition_dir = self._edition_dir(segment.edition_id)
+        audio_path = edition_dir / audio_filename
+        
+        return {
+            'script': script,
+            'voice_model': voice_model,
+            'cache_key': cache_key,
+            'audio_path': audio_path,
+            # Streamed downloads land here first so a partial file never looks complete
+            'partial_path': audio_path.with_name(audio_filename + '.part')
+        }
+    
+    def _record_segment_audio(self, segment: EditionSegment, plan: Dict[str, Any]) -> str:
+        """Store the generated audio path on the segment metadata"""
+        
+        relative_path = str(plan['audio_path'].relative_to(self._static_root))
+        # Assign a new dict so SQLAlchemy sees the JSON column change
+        segment.segment_metadata = {
+            **(segment.segment_metadata or {}),
+            'audio_file': relative_path,
+            'tts_voice': plan['voice_model'],
+            'tts_generated_at_ns': time.time_ns(),
+            'anchor_script': plan['script']
+        }
+        
+        return relative_path
+    
+    def _reuse_existing_audio(self, plan: Dict[str, Any]) -> bool:
+        """Satisfy a plan from its existing file or the audio cache; False if it needs synthesis"""
+        
+        # An existing file already holds this exact script/voice rendering
+        if plan['audio_path'].exists():
+            return True
+        
+        cached_path = self.audio_cache.get(plan['cache_key'])
+        if cached_path:
+            # Reuse previously synthesized audio for the same script/voice
+            link_or_copy(cached_path, plan['audio_path'])
+            return True
+        
+        return False
+    
+    def _pack_batches(self, plans: List[Dict[str, Any]], indices: List[int]) -> List[List[int]]:
+        """Greedily pack same-voice plans into batches whose joined scripts fit one TTS request"""
+        batches_by_voice: Dict[str, List[List[int]]] = defaultdict(list)
+        batch_length: Dict[str, int] = {}
+        
+        for index in indices:
+            voice_model = plans[index]['voice_model']
+            script_length = len(plans[index]['script'])
+            batches = batches_by_voice[voice_model]
+            
+            joined_length = batch_length.get(voice_model, 0) + len(self.BATCH_PAUSE) + script_length
+            if batches and joined_length <= self.MAX_BATCH_CHARS:
+                batches[-1].append(index)
+                batch_length[voice_model] = joined_length
+            else:
+                batches.append([index])
+                batch_length[voice_model] = script_length
+        
+        return [batch for batches in batches_by_voice.values() for batch in batches]
+    
+    async def _synthesize_all_async(self, plans: List[Dict[str, Any]],
+                                    on_complete: Callable[[int, Any], None]) -> None:
+        """
+        Synthesize all planned segments concurrently, bounded by MAX_CONCURRENCY
+        
+        Plans without existing or cached audio are packed into same-voice batches
+        so an edition needs far fewer TTS requests. on_complete(index, result) is
+        called as each plan finishes, with True or the exception that failed it.
+        """
+        sem = asyncio.Semaphore(self.MAX_CONCURRENCY)
+        pending = []
+        
+        for index, plan in enumerate(plans):
+            if await asyncio.to_thread(self._reuse_existing_audio, plan):
+                on_complete(index, True)
+            else:
+                pending.append(index)
+        
+        async with self._initialize_async_openai() as client:
+            async def run_batch(batch: List[int]):
+                return batch, await self._synthesize_batch_async(client, [plans[index] for index in batch], sem)
+            
+            # Report each batch as soon as it lands instead of waiting for the slowest
+            for next_batch in asyncio.as_completed([run_batch(batch) for batch in self._pack_batches(plans, pending)]):
+                batch, outcomes = await next_batch
+                for index, outcome in zip(batch, outcomes):
+                    on_complete(index, outcome)
+    
+    async def _synthesize_batch_async(self, client: 'AsyncOpenAI', batch: List[Dict[str, Any]],
+                                      sem: asyncio.Semaphore) -> List[Any]:
+        """Synthesize a batch in one request, falling back to one request per plan"""
+        
+        if len(batch) > 1:
+            try:
+                if await self._generate_batch_async(client, batch, sem):
+                    return [True] * len(batch)
+            except Exception as e:
+                self.logger.warning(f"Batched TTS request for {len(batch)} segments failed: {e}")
+        
+        tasks = [self._generate_segment_async(client, plan, sem) for plan in batch]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def _generate_batch_async(self, client: 'AsyncOpenAI', batch: List[Dict[str, Any]],
+                                    sem: asyncio.Semaphore) -> bool:
+        """Synthesize several scripts in a single TTS request and split the result on silence"""
+        
+        async with sem:
+            async with client.audio.speech.with_streaming_response.create(
+                model=self.TTS_MODEL,
+                voice=batch[0]['voice_model'],
+                input=self.BATCH_PAUSE.join(plan['script'] for plan in batch),
+                response_format=self.AUDIO_FORMAT,
+                speed=self.SPEED
+            ) as response:
+                audio_data = await response.read()
+        
+        return await asyncio.to_thread(self._split_batch_audio, audio_data, batch)
+    
+    def _split_batch_audio(self, audio_data: bytes, batch: List[Dict[str, Any]]) -> bool:
+        """Write one file per plan from batched audio; False if the pieces don't line up"""
+        from pydub import AudioSegment
+        from pydub.silence import split_on_silence
+        
+        audio = AudioSegment.from_file(io.BytesIO(audio_data), format=self.AUDIO_FORMAT)
+        pieces = split_on_silence(
+            audio,
+            min_silence_len=self.BATCH_MIN_SILENCE_MS,
+            silence_thresh=self.BATCH_SILENCE_THRESH_DB
+        )
+        
+        if len(pieces) != len(batch):
+            self.logger.warning(f"Silence split found {len(pieces)} pieces for {len(batch)} segments - "
+                                f"retrying individually")
+            return False
+        
+        for plan, piece in zip(batch, pieces):
+            piece.export(plan['partial_path'], format=self.AUDIO_FORMAT)
+            os.replace(plan['partial_path'], plan['audio_path'])
+            self.audio_cache.put(plan['cache_key'], plan['audio_path'])
+        
+        return True
+    
+    def _synthesize_edition(self, plans: List[Dict[str, Any]], on_complete: Callable[[int, Any], None]) -> None:
+        """
+        Synthesize an edition's plans, calling TTS once per distinct script
+        
+        Segments repeating an earlier script (re-syndicated wire stories) get a
+        hard link to that segment's audio and take over its voice.
+        on_complete(index, result) is called per plan as soon as its audio is
+        ready (result True) or has failed (result is the exception).
+        """
+        groups = group_identical_scripts([plan['script'] for plan in plans])
+        
+        def group_complete(group_index: int, result: Any) -> None:
+            group = groups[group_index]
+            leader = plans[group[0]]
+            on_complete(group[0], result)
+            for index in group[1:]:
+                plans[index]['voice_model'] = leader['voice_model']
+                if not isinstance(result, Exception):
+                    try:
+                        link_or_copy(leader['audio_path'], plans[index]['audio_path'])
+                    except OSError as e:
+                        on_complete(index, e)
+                        continue
+                on_complete(index, result)
+        
+        asyncio.run(self._synthesize_all_async([plans[group[0]] for group in groups], group_complete))
+    
+    async def _generate_segment_async(self, client: 'AsyncOpenAI', plan: Dict[str, Any],
+                                      sem: asyncio.Semaphore) -> bool:
+        """Synthesize one segment with AsyncOpenAI"""
+        
+        async with sem:
+            async with client.audio.speech.with_streaming_response.create(
+                model=self.TTS_MODEL,
+                voice=plan['voice_model'],
+                input=plan['script'],
+                response_format=self.AUDIO_FORMAT,
+                speed=self.SPEED
+            ) as response:
+                await response.stream_to_file(plan['partial_path'])
+        
+        await asyncio.to_thread(os.replace, plan['partial_path'], plan['audio_path'])
+        await asyncio.to_thread(self.audio_cache.put, plan['cache_key'], plan['audio_path'])
+        return True
+    
+    def generate_full_edition_audio(self, edition_id: int,
+                                    progress_callback: Optional[Callable[[int, int, int], None]] = None) -> Dict[str, Any]:
         """
         Generate complete audio package for a daily edition
         
         Args:
             edition_id: DailyEdition ID
+            progress_callback: Optional callable(segment_id, completed, total) invoked as each segment finishes
             
         Returns:
             Generation results summary
@@ -201,39 +458,59 @@ class NewsAnchorTTS:
                 if not segments:
                     return {'status': 'error', 'message': f'No segments found for edition {edition_id}'}
                 
-                generated_files = []
+                if not self.openai_client:
+                    return {'status': 'error', 'message': 'OpenAI client not initialized - cannot generate audio'}
+                
+                generated = {}
                 failed_segments = []
                 total_duration = 0
+                completed = 0
+                
+                # Alternate voices for variety
+                edition_dir = self._edition_dir(edition_id)
+                plans = [
+                    self._plan_segment_audio(segment, 'primary' if i % 2 == 0 else 'male', edition_dir)
+                    for i, segment in enumerate(segments)
+                ]
                 
-                # Generate audio for each segment
-                for i, segment in enumerate(segments):
-                    voice = 'primary' if i % 2 == 0 else 'male'  # Alternate voices for variety
+                def record_result(index: int, result: Any) -> None:
+                    nonlocal total_duration, completed
+                    segment = segments[index]
+                    completed += 1
                     
-                    audio_path = self.generate_audio_for_segment(segment, voice)
-                    if audio_path:
-                        generated_files.append({
+                    if isinstance(result, Exception):
+                        self.logger.error(f"Failed to generate audio for segment {segment.id}: {result}")
+                        failed_segments.append(segment.id)
+                    else:
+                        audio_path = self._record_segment_audio(segment, plans[index])
+                        self.logger.info(f"Generated audio for segment {segment.id}: {audio_path}")
+                        generated[index] = {
                             'segment_id': segment.id,
                             'audio_path': audio_path,
                             'duration': segment.duration_sec
-                        })
+                        }
                         total_duration += segment.duration_sec
-                    else:
-                        failed_segments.append(segment.id)
+                    
+                    self.logger.info(f"Edition {edition_id} audio progress: {completed}/{len(segments)}")
+                    if progress_callback:
+                        progress_callback(segment.id, completed, len(segments))
                 
-                # Update edition metadata
-                edition.edition_metadata = edition.edition_metadata or {}
-                if isinstance(edition.edition_metadata, str):
-                    edition.edition_metadata = json.loads(edition.edition_metadata)
+                # Synthesize all distinct scripts concurrently, recording each as it completes
+                self._synthesize_edition(plans, record_result)
+                generated_files = [generated[index] for index in sorted(generated)]
                 
-                edition.edition_metadata.update({
+                # Update edition metadata
+                edition.edition_metadata = {
+                    **(edition.edition_metadata or {}),
                     'audio_generated': True,
-                    'audio_generation_date': datetime.now().isoformat(),
+                    'audio_generated_at_ns': time.time_ns(),
                     'generated_segments': len(generated_files),
                     'failed_segments': len(failed_segments),
                     'total_audio_duration': total_duration,
                     'audio_files': generated_files
-                })
+                }
                 
+                # Single commit for all segment and edition metadata
                 db.session.commit()
                 
                 return {
@@ -3,9 +3,15 @@ Offline News Anchor TTS Service - Generate professional news anchor audio withou
 Uses pyttsx3 (built-in) and StyleTTS2 for high-quality offline text-to-speech
 """
 import os
-import json
+import re
+import hashlib
+import functools
 import logging
-from datetime import datetime, date
+import time
+import threading
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 import tempfile
@@ -13,6 +19,31 @@ import subprocess
 
 from app import app, db
 from models import DailyEdition, EditionSegment
+from services.audio_cache import AudioCache, audio_cache_key, group_identical_scripts, link_or_copy
+from services import pyttsx3_worker
+
+# Sentence boundaries (terminator kept with its sentence) and words that warrant emphasis
+_SENT_RE = re.compile(r'(?<=[.!?])\s+')
+_EMPH_RE = re.compile(r'\b(breaking|urgent|crisis|emergency)\b', re.I)
+
+# Professional news anchor pace, used to size scripts to a target duration
+TARGET_WORDS_PER_MINUTE = 160
+
+# Shared pool of pyttsx3 worker processes, created on first use.
+# pyttsx3 engines are not fork-safe, so workers are spawned fresh.
+_pyttsx3_pool: Optional[ProcessPoolExecutor] = None
+_pyttsx3_pool_lock = threading.Lock()
+
+
+def _get_pyttsx3_pool() -> ProcessPoolExecutor:
+    global _pyttsx3_pool
+    with _pyttsx3_pool_lock:
+        if _pyttsx3_pool is None:
+            _pyttsx3_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pyttsx3_pool
 
 class OfflineNewsAnchorTTS:
     """Generate professional news anchor-style audio using offline TTS engines"""
@@ -26,47 +57,25 @@ class OfflineNewsAnchorTTS:
     
     # Audio settings
     AUDIO_FORMAT = 'wav'
-    TARGET_WORDS_PER_MINUTE = 160  # Professional news anchor pace
     SEGMENT_TARGET_DURATION = 180  # 3 minutes per segment
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.audio_dir = Path('static/audio/news')
+        self._static_root = Path('static').resolve()
+        self.audio_dir = self._static_root / 'audio' / 'news'
         self.audio_dir.mkdir(parents=True, exist_ok=True)
+        self.audio_cache = AudioCache(self.audio_dir / 'cache', self.AUDIO_FORMAT)
         
-        # Initialize TTS engines
-        self.pyttsx3_engine = self._init_pyttsx3()
+        # Initialize TTS engines (pyttsx3 engines live in worker processes)
+        self.pyttsx3_available = self._check_pyttsx3()
         self.styletts2_available = self._check_styletts2()
         
-    def _init_pyttsx3(self):
-        """Initialize pyttsx3 engine with news anchor settings"""
-        try:
-            import pyttsx3
-            
-            engine = pyttsx3.init()
-            
-            # Set professional news anchor voice settings
-            voices = engine.getProperty('voices')
-            if voices:
-                # Prefer female voice for news anchor (usually more professional)
-                for voice in voices:
-                    if 'female' in voice.name.lower() or 'woman' in voice.name.lower():
-                        engine.setProperty('voice', voice.id)
-                        break
-                else:
-                    # Fallback to first available voice
-                    engine.setProperty('voice', voices[0].id)
-            
-            # Set professional speaking rate and volume
-            engine.setProperty('rate', 160)  # Words per minute
-            engine.setProperty('volume', 0.9)  # Volume level (0.0 to 1.0)
-            
-            self.logger.info("pyttsx3 TTS engine initialized successfully")
-            return engine
-            
-        except Exception as e:
-            self.logger.error(f"Failed to initialize pyttsx3: {e}")
-            return None
+    def _check_pyttsx3(self) -> bool:
+        """Check if pyttsx3 is installed"""
+        if importlib.util.find_spec('pyttsx3') is None:
+            self.logger.error("pyttsx3 is not installed - offline TTS disabled")
+            return False
+        return True
     
     def _check_styletts2(self) -> bool:
         """Check if StyleTTS2 is available"""
@@ -74,7 +83,9 @@ class OfflineNewsAnchorTTS:
         self.logger.info("StyleTTS2 disabled to avoid worker crashes, using pyttsx3 only")
         return False
     
-    def generate_anchor_script(self, headline: str, content: str, duration_target: int = 180) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def generate_anchor_script(headline: str, content: str, duration_target: int = 180) -> str:
         """
         Generate professional news anchor script from headline and content
         
@@ -87,7 +98,7 @@ class OfflineNewsAnchorTTS:
             Professional anchor script formatted for TTS
         """
         # Calculate target word count based on speaking pace
-        target_words = (duration_target * self.TARGET_WORDS_PER_MINUTE) // 60
+        target_words = (duration_target * TARGET_WORDS_PER_MINUTE) // 60
         
         # Create anchor-style script with proper pacing
         intro_words = "Good evening from our international news desk."
@@ -98,7 +109,7 @@ class OfflineNewsAnchorTTS:
             formatted_headline += "."
         
         # Process content for news anchor delivery
-        formatted_content = self._format_content_for_anchor(content, target_words - 25)  # Reserve words for intro/outro
+        formatted_content = OfflineNewsAnchorTTS._format_content_for_anchor(content, target_words - 25)  # Reserve words for intro/outro
         
         outro_words = "We will continue monitoring this developing story. This has been your international news update."
         
@@ -107,7 +118,9 @@ class OfflineNewsAnchorTTS:
         
         return script.strip()
     
-    def _format_content_for_anchor(self, content: str, target_words: int) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _format_content_for_anchor(content: str, target_words: int) -> str:
         """Format content in news anchor style with proper pacing"""
         
         if not content:
@@ -115,7 +128,7 @@ class OfflineNewsAnchorTTS:
         
         # Clean and split content
         content = content.replace('\n', ' ').replace('\r', ' ')
-        sentences = [s.strip() for s in content.split('.') if s.strip()]
+        sentences = [s.strip() for s in _SENT_RE.split(content) if s.strip()]
         
         formatted_sentences = []
         word_count = 0
@@ -129,7 +142,7 @@ class OfflineNewsAnchorTTS:
                 sentence = f"According to reports, {sentence.lower()}"
             
             # Add emphasis for key terms
-            if any(word in sentence.lower() for word in ['breaking', 'urgent', 'crisis', 'emergency']):
+            if _EMPH_RE.search(sentence):
                 sentence = f"In a developing situation, {sentence.lower()}"
             
             # Check word count
@@ -140,31 +153,22 @@ class OfflineNewsAnchorTTS:
             formatted_sentences.append(sentence)
             word_count += words_in_sentence
         
-        result = '. '.join(formatted_sentences)
-        if result and not result.endswith('.'):
+        result = ' '.join(formatted_sentences)
+        if result and not result.endswith(('.', '!', '?')):
             result += '.'
             
         return result or "Details are developing and updates will follow."
     
     def generate_audio_with_pyttsx3(self, text: str, output_path: str) -> bool:
-        """Generate audio using pyttsx3 (offline)"""
-        if not self.pyttsx3_engine:
+        """Generate audio using pyttsx3 (offline) in a worker process"""
+        if not self.pyttsx3_available:
             return False
             
         try:
-            # Save to temporary file first, then move to final location
-            temp_path = str(output_path) + ".tmp"
-            
-            self.pyttsx3_engine.save_to_file(text, temp_path)
-            self.pyttsx3_engine.runAndWait()
-            
-            # Move temp file to final location
-            if os.path.exists(temp_path):
-                os.rename(temp_path, output_path)
-                return True
-            else:
-                self.logger.error(f"pyttsx3 failed to create audio file: {temp_path}")
-                return False
+            future = _get_pyttsx3_pool().submit(
+                pyttsx3_worker.synthesize, text, str(output_path), self.PYTTSX3_VOICES['professional_female']
+            )
+            return future.result()
                 
         except Exception as e:
             self.logger.error(f"pyttsx3 audio generation failed: {e}")
@@ -195,65 +199,65 @@ class OfflineNewsAnchorTTS:
             self.logger.error(f"StyleTTS2 audio generation failed: {e}")
             return False
     
-    def generate_audio_for_segment(self, segment: EditionSegment, quality: str = 'standard') -> Optional[str]:
+    def _generate_cached(self, script: str, audio_path: Path, engine: str, generate) -> bool:
+        """Reuse existing or cached audio for (script, engine), else synthesize and cache it"""
+        if audio_path.exists():
+            return True
+        
+        cache_key = audio_cache_key(script, engine, self.AUDIO_FORMAT)
+        
+        cached_path = self.audio_cache.get(cache_key)
+        if cached_path:
+            link_or_copy(cached_path, audio_path)
+            return True
+        
+        if not generate(script, str(audio_path)):
+            return False
+        
+        self.audio_cache.put(cache_key, audio_path)
+        return True
+    
+    def generate_audio_for_segment(self, segment: EditionSegment, quality: str = 'standard',
+                                   commit: bool = True, edition_dir: Optional[Path] = None) -> Optional[str]:
         """
         Generate TTS audio for a news segment
         
         Args:
             segment: EditionSegment to generate audio for
             quality: 'standard' (pyttsx3) or 'high' (StyleTTS2)
+            commit: Commit the metadata update immediately (False when batching)
+            edition_dir: Existing output directory for the edition (created if omitted)
             
         Returns:
             Path to generated audio file or None if failed
         """
         try:
-            # Generate anchor script
-            script = self.generate_anchor_script(
-                segment.headline,
-                segment.transcript_text or segment.headline,
-                segment.duration_sec
-            )
-            
-            # Create audio filename
-            audio_filename = f"segment_{segment.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{self.AUDIO_FORMAT}"
-            audio_path = self.audio_dir / str(segment.edition_id) / audio_filename
-            audio_path.parent.mkdir(parents=True, exist_ok=True)
+            plan = self._plan_segment_audio(segment, edition_dir)
+            script = plan['script']
+            audio_path = plan['audio_path']
             
             # Try high-quality first if requested, then fallback to standard
             success = False
             tts_engine_used = "unknown"
             
             if quality == 'high' and self.styletts2_available:
-                success = self.generate_audio_with_styletts2(script, str(audio_path))
                 tts_engine_used = "StyleTTS2"
+                success = self._generate_cached(script, audio_path, tts_engine_used,
+                                                self.generate_audio_with_styletts2)
                 
             if not success:
                 # Fallback to pyttsx3
-                success = self.generate_audio_with_pyttsx3(script, str(audio_path))
                 tts_engine_used = "pyttsx3"
+                success = self._generate_cached(script, audio_path, tts_engine_used,
+                                                self.generate_audio_with_pyttsx3)
             
             if not success:
                 self.logger.error(f"All TTS engines failed for segment {segment.id}")
                 return None
             
-            # Update segment with audio path
-            relative_path = str(audio_path.relative_to(Path('static')))
-            
-            # Handle segment metadata
-            if segment.segment_metadata is None:
-                segment.segment_metadata = {}
-            elif isinstance(segment.segment_metadata, str):
-                segment.segment_metadata = json.loads(segment.segment_metadata)
-            
-            segment.segment_metadata.update({
-                'audio_file': relative_path,
-                'tts_engine': tts_engine_used,
-                'tts_generated_at': datetime.now().isoformat(),
-                'anchor_script': script,
-                'audio_quality': quality
-            })
-            
-            db.session.commit()
+            relative_path = self._record_segment_audio(segment, plan, tts_engine_used, quality)
+            if commit:
+                db.session.commit()
             
             self.logger.info(f"Generated {quality} quality audio for segment {segment.id} using {tts_engine_used}: {relative_path}")
             return relative_path
@@ -262,6 +266,118 @@ class OfflineNewsAnchorTTS:
             self.logger.error(f"Failed to generate audio for segment {segment.id}: {e}")
             return None
     
+    def _edition_dir(self, edition_id: int) -> Path:
+        """Create (if needed) and return the audio directory for an edition"""
+        edition_dir = self.audio_dir / str(edition_id)
+        edition_dir.mkdir(parents=True, exist_ok=True)
+        return edition_dir
+    
+    def _plan_segment_audio(self, segment: EditionSegment, edition_dir: Optional[Path] = None) -> Dict[str, Any]:
+        """Build the anchor script and output path for a segment"""
+        
+        # Generate anchor script
+        script = self.generate_anchor_script(
+            segment.headline,
+            segment.transcript_text or segment.headline,
+            segment.duration_sec
+        )
+        
+        # Name the file after its script so an existing file means it is already rendered
+        script_hash = hashlib.sha256(script.encode('utf-8')).hexdigest()
+        audio_filename = f"segment_{segment.id}_{script_hash[:12]}.{self.AUDIO_FORMAT}"
+        if edition_dir is None:
+            edition_dir = self._edition_dir(segment.edition_id)
+        audio_path = edition_dir / audio_filename
+        
+        return {'script': script, 'audio_path': audio_path}
+    
+    def _record_segment_audio(self, segment: EditionSegment, plan: Dict[str, Any],
+                              tts_engine_used: str, quality: str) -> str:
+        """Store the generated audio path on the segment metadata"""
+        
+        # Update segment with audio path
+        relative_path = str(plan['audio_path'].relative_to(self._static_root))
+        
+        # Assign a new dict so SQLAlchemy sees the JSON column change
+        segment.segment_metadata = {
+            **(segment.segment_metadata or {}),
+            'audio_file': relative_path,
+            'tts_engine': tts_engine_used,
+            'tts_generated_at_ns': time.time_ns(),
+            'anchor_script': plan['script'],
+            'audio_quality': quality
+        }
+        
+        return relative_path
+    
+    def _synthesize_edition(self, plans: List[Dict[str, Any]], quality: str) -> List[Optional[str]]:
+        """
+        Synthesize all planned segments, running pyttsx3 jobs in parallel worker processes
+        
+        Identical scripts are synthesized once; the other segments hard-link that audio.
+        
+        Returns:
+            The TTS engine used for each plan (None if synthesis failed), in plan order
+        """
+        engines: List[Optional[str]] = [None] * len(plans)
+        futures = {}
+        groups = group_identical_scripts([plan['script'] for plan in plans])
+        
+        for group in groups:
+            index = group[0]
+            plan = plans[index]
+            # StyleTTS2 runs in-process; only used when explicitly requested
+            if quality == 'high' and self.styletts2_available:
+                if self._generate_cached(plan['script'], plan['audio_path'], "StyleTTS2",
+                                         self.generate_audio_with_styletts2):
+                    engines[index] = "StyleTTS2"
+                    continue
+            
+            if plan['audio_path'].exists():
+                engines[index] = "pyttsx3"
+                continue
+            
+            cache_key = audio_cache_key(plan['script'], "pyttsx3", self.AUDIO_FORMAT)
+            cached_path = self.audio_cache.get(cache_key)
+            if cached_path:
+                link_or_copy(cached_path, plan['audio_path'])
+                engines[index] = "pyttsx3"
+                continue
+            
+            if not self.pyttsx3_available:
+                continue
+            
+            future = _get_pyttsx3_pool().submit(
+                pyttsx3_worker.synthesize, plan['script'], str(plan['audio_path']),
+                self.PYTTSX3_VOICES['professional_female']
+            )
+            futures[future] = (index, cache_key)
+        
+        for future in as_completed(futures):
+            index, cache_key = futures[future]
+            try:
+                success = future.result()
+            except Exception as e:
+                self.logger.error(f"pyttsx3 audio generation failed: {e}")
+                success = False
+            
+            if success:
+                self.audio_cache.put(cache_key, plans[index]['audio_path'])
+                engines[index] = "pyttsx3"
+        
+        for group in groups:
+            leader = group[0]
+            if not engines[leader]:
+                continue
+            for index in group[1:]:
+                try:
+                    link_or_copy(plans[leader]['audio_path'], plans[index]['audio_path'])
+                    engines[index] = engines[leader]
+                except OSError as e:
+                    self.logger.error(f"Failed to link shared audio for {plans[index]['audio_path']}: {e}")
+        
+        return engines
+    
     def generate_full_edition_audio(self, edition_id: int, quality: str = 'standard') -> Dict[str, Any]:
         """
         Generate complete audio package for a daily edition
@@ -289,35 +405,40 @@ class OfflineNewsAnchorTTS:
                 failed_segments = []
                 total_duration = 0
                 
-                # Generate audio for each segment
-                for segment in segments:
-                    audio_path = self.generate_audio_for_segment(segment, quality)
-                    if audio_path:
-                        generated_files.append({
-                            'segment_id': segment.id,
-                            'audio_path': audio_path,
-                            'duration': segment.duration_sec
-                        })
-                        total_duration += segment.duration_sec
-                    else:
+                # Generate audio for all segments in parallel
+                edition_dir = self._edition_dir(edition_id)
+                plans = [self._plan_segment_audio(segment, edition_dir) for segment in segments]
+                engines = self._synthesize_edition(plans, quality)
+                
+                for segment, plan, tts_engine_used in zip(segments, plans, engines):
+                    if not tts_engine_used:
+                        self.logger.error(f"All TTS engines failed for segment {segment.id}")
                         failed_segments.append(segment.id)
+                        continue
+                    
+                    audio_path = self._record_segment_audio(segment, plan, tts_engine_used, quality)
+                    self.logger.info(f"Generated {quality} quality audio for segment {segment.id} using {tts_engine_used}: {audio_path}")
+                    
+                    generated_files.append({
+                        'segment_id': segment.id,
+                        'audio_path': audio_path,
+                        'duration': segment.duration_sec
+                    })
+                    total_duration += segment.duration_sec
                 
                 # Update edition metadata
-                if edition.edition_metadata is None:
-                    edition.edition_metadata = {}
-                elif isinstance(edition.edition_metadata, str):
-                    edition.edition_metadata = json.loads(edition.edition_metadata)
-                
-                edition.edition_metadata.update({
+                edition.edition_metadata = {
+                    **(edition.edition_metadata or {}),
                     'audio_generated': True,
-                    'audio_generation_date': datetime.now().isoformat(),
+                    'audio_generated_at_ns': time.time_ns(),
                     'generated_segments': len(generated_files),
                     'failed_segments': len(failed_segments),
                     'total_audio_duration': total_duration,
                     'audio_quality': quality,
                     'audio_files': generated_files
-                })
+                }
                 
+                # Single commit for all segment and edition metadata
                 db.session.commit()
                 
                 return {
@@ -342,7 +463,7 @@ class OfflineNewsAnchorTTS:
         }
         
         # Test pyttsx3
-        if self.pyttsx3_engine:
+        if self.pyttsx3_available:
             try:
                 test_file = self.audio_dir / "test_pyttsx3.wav"
                 success = self.generate_audio_with_pyttsx3("This is a test of the pyttsx3 news anchor voice.", str(test_file))
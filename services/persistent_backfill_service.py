@@ -9,14 +9,17 @@ import time
 import gc
 import psutil
 import os
+from collections import deque
 from datetime import datetime, date, timedelta
-from typing import Dict, List, Optional
-import traceback
+from typing import Deque, Dict, List, Optional, Set
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from sqlalchemy import insert, text
+from sqlalchemy.dialects import postgresql, sqlite
 
 from app import app, db
-from models import DailyEdition, ProviderSource
-from services.historical_news_generator import HistoricalNewsGenerator
+from models import DailyEdition, EditionSegment, ProviderSource
 
 
 class PersistentBackfillService:
@@ -27,6 +30,11 @@ class PersistentBackfillService:
         self.is_running = False
         self.worker_thread = None
         self.shutdown_event = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        
+        # Jitter sources: one for the service loop, one per worker thread for retries
+        self._rng = random.Random()
+        self._worker_rngs = threading.local()
         
         # Optimized configuration for stability
         self.batch_size = 5  # Very small batches for maximum stability
@@ -34,9 +42,18 @@ class PersistentBackfillService:
         self.max_retries = 3
         self.memory_check_interval = 50  # Check memory every 50 processed items
         self.restart_interval_hours = 6  # Auto-restart every 6 hours
+        self.missing_cache_ttl = 600  # Re-scan the DB for missing dates at most every 10 minutes
+        self.max_workers = 4  # Concurrent dates per batch; well under the engine's pool_size
         
         # Target years (2001-2017)
         self.target_years = list(range(2001, 2018))
+        self.range_start = date(self.target_years[0], 1, 1)
+        self.range_end = date(self.target_years[-1], 12, 31)
+        self.all_dates = tuple(
+            self.range_start + timedelta(days=n)
+            for n in range((self.range_end - self.range_start).days + 1)
+        )
+        self._total_days_target = len(self.all_dates)
         
         # Statistics
         self.stats = {
@@ -47,16 +64,23 @@ class PersistentBackfillService:
             'start_time': datetime.now()
         }
         
-        # Initialize generator
-        self.generator = HistoricalNewsGenerator()
+        # Handle on this process for memory checks
+        self._proc = psutil.Process(os.getpid())
+        
+        # Content generator, created in start() and released in stop()
+        self.generator = None
+        
+        # Historical provider id, resolved once in start()
+        self.historical_provider_id: Optional[int] = None
         
-        # Historical provider (dynamic lookup)
-        self.historical_provider = None
+        # Sorted missing dates, consumed batch by batch between DB re-scans
+        self._missing_cache: Deque[date] = deque()
+        self._missing_cache_ts = 0.0
         
-    def _get_or_create_historical_provider(self):
-        """Get or create the historical provider"""
-        if self.historical_provider:
-            return self.historical_provider
+    def _get_historical_provider_id(self) -> int:
+        """Get or create the historical provider and cache its id"""
+        if self.historical_provider_id is not None:
+            return self.historical_provider_id
             
         with app.app_context():
             provider = ProviderSource.query.filter_by(key='HistoricalNewsGenerator').first()
@@ -72,8 +96,40 @@ class PersistentBackfillService:
                 db.session.commit()
                 self.logger.info("Created historical provider")
             
-            self.historical_provider = provider
-            return provider
+            # Cache the plain id: the ORM object would be detached once this context closes
+            self.historical_provider_id = provider.id
+            return self.historical_provider_id
+    
+    def _get_generator(self):
+        """Historical content generator, created on first use"""
+        if self.generator is None:
+            from services.historical_news_generator import HistoricalNewsGenerator
+            self.generator = HistoricalNewsGenerator()
+        return self.generator
+    
+    def _edition_insert(self):
+        """INSERT for DailyEdition that skips rows already present for the date/edition slot"""
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            stmt = postgresql.insert(DailyEdition)
+        elif dialect == 'sqlite':
+            stmt = sqlite.insert(DailyEdition)
+        else:
+            return insert(DailyEdition)
+        return stmt.on_conflict_do_nothing(index_elements=['date', 'edition_number'])
+    
+    def _worker_rng(self) -> random.Random:
+        """This thread's own Random, so workers don't share the module-level instance"""
+        rng = getattr(self._worker_rngs, 'rng', None)
+        if rng is None:
+            rng = self._worker_rngs.rng = random.Random(os.urandom(8))
+        return rng
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Worker pool for per-date processing, created on first use"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="backfill")
+        return self._executor
     
     def start(self):
         """Start the persistent backfill service"""
@@ -83,6 +139,9 @@ class PersistentBackfillService:
             
         self.is_running = True
         self.shutdown_event.clear()
+        self._get_historical_provider_id()
+        self._get_generator()
+        self._get_executor()
         
         self.worker_thread = threading.Thread(target=self._service_loop, daemon=True)
         self.worker_thread.start()
@@ -96,6 +155,14 @@ class PersistentBackfillService:
         
         if self.worker_thread:
             self.worker_thread.join(timeout=30)
+        
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        
+        # Release the generator's word lists and templates
+        self.generator = None
+        gc.collect()
             
         self.logger.info("Persistent Backfill Service stopped")
     
@@ -111,19 +178,23 @@ class PersistentBackfillService:
                     continue
                 
                 # Find and process missing dates
-                missing_dates = self._find_missing_dates()
+                missing_dates = self._get_missing_dates()
                 
                 if not missing_dates:
                     self.logger.info("✅ All historical editions completed!")
-                    time.sleep(300)  # Check again in 5 minutes
+                    self.shutdown_event.wait(300)  # Check again in 5 minutes
                     continue
                 
-                # Process a small batch
-                batch_dates = missing_dates[:self.batch_size]
-                self.logger.info(f"Processing batch of {len(batch_dates)} missing dates")
+                # Take a small batch off the front of the queue
+                batch_dates = [missing_dates.popleft() for _ in range(min(self.batch_size, len(missing_dates)))]
+                self.logger.info("Processing batch of %d missing dates", len(batch_dates))
                 
                 # Process batch with full error handling
-                success_count, error_count = self._process_batch_with_recovery(batch_dates)
+                succeeded, failed = self._process_batch_with_recovery(batch_dates)
+                success_count, error_count = len(succeeded), len(failed)
+                
+                # Failed dates go to the back so they can't starve the rest
+                missing_dates.extend(sorted(failed))
                 
                 # Update statistics
                 self.stats['total_processed'] += success_count
@@ -152,134 +223,156 @@ class PersistentBackfillService:
                     sleep_time *= 2  # Double sleep time if no progress
                 
                 # Add random jitter to prevent thundering herd
-                jitter = random.uniform(0.7, 1.3)
+                jitter = self._rng.uniform(0.7, 1.3)
                 actual_sleep = sleep_time * jitter
                 
-                self.logger.debug(f"Sleeping {actual_sleep:.1f}s before next batch")
+                self.logger.debug("Sleeping %.1fs before next batch", actual_sleep)
                 self.shutdown_event.wait(actual_sleep)
                 
             except Exception as e:
                 consecutive_errors += 1
-                self.logger.error(f"Service loop error: {e}")
-                self.logger.debug(traceback.format_exc())
+                self.logger.error("Service loop error: %s", e)
+                self.logger.debug("Service loop traceback", exc_info=True)
                 
                 # Progressive backoff on errors
                 error_sleep = min(60, 10 * consecutive_errors)
                 self.shutdown_event.wait(error_sleep)
     
+    def _get_missing_dates(self) -> Deque[date]:
+        """Cached missing dates, re-queried when exhausted or older than missing_cache_ttl"""
+        if not self._missing_cache or time.monotonic() - self._missing_cache_ts > self.missing_cache_ttl:
+            self._missing_cache = deque(self._find_missing_dates())
+            self._missing_cache_ts = time.monotonic()
+        return self._missing_cache
+    
     def _find_missing_dates(self) -> List[date]:
         """Find all missing dates across target years"""
-        missing_dates = []
-        
         with app.app_context():
-            for year in self.target_years:
-                start_date = date(year, 1, 1)
-                end_date = date(year, 12, 31)
-                
-                # Get existing dates for this year
-                existing_dates = set()
-                editions = DailyEdition.query.filter(
-                    DailyEdition.date >= start_date,
-                    DailyEdition.date <= end_date
-                ).all()
-                
-                for edition in editions:
-                    existing_dates.add(edition.date)
-                
-                # Find missing dates
-                current_date = start_date
-                while current_date <= end_date:
-                    if current_date not in existing_dates:
-                        missing_dates.append(current_date)
-                    current_date += timedelta(days=1)
+            if db.engine.dialect.name == 'postgresql':
+                # Let the server diff the calendar against existing editions
+                rows = db.session.execute(text(
+                    "SELECT d::date FROM generate_series(CAST(:start AS date), CAST(:end AS date), interval '1 day') AS d "
+                    "LEFT JOIN daily_edition e ON e.date = d::date "
+                    "WHERE e.date IS NULL ORDER BY d"
+                ), {'start': self.range_start, 'end': self.range_end})
+                return [missing_date for (missing_date,) in rows]
+            
+            # One query for every existing edition date in the target range, streamed in chunks
+            existing_dates = {
+                edition_date for (edition_date,) in db.session.query(DailyEdition.date).filter(
+                    DailyEdition.date.between(self.range_start, self.range_end)
+                ).distinct().yield_per(10000)
+            }
         
-        return missing_dates
+        return [d for d in self.all_dates if d not in existing_dates]
     
-    def _process_batch_with_recovery(self, dates: List[date]) -> tuple[int, int]:
-        """Process a batch with comprehensive error recovery"""
-        success_count = 0
-        error_count = 0
+    def _process_batch_with_recovery(self, dates: List[date]) -> tuple[Set[date], Set[date]]:
+        """Process a batch with comprehensive error recovery; returns (succeeded, failed) dates"""
+        succeeded: Set[date] = set()
+        failed: Set[date] = set()
         
-        for target_date in dates:
-            retry_count = 0
-            processed = False
+        # Resolve shared state before fanning out so workers never race to create it
+        self._get_historical_provider_id()
+        generator = self._get_generator()
+        
+        # Dates are independent, so process them concurrently on the worker pool
+        futures = {self._get_executor().submit(self._process_one_date, d, generator): d for d in dates}
+        for future in as_completed(futures):
+            target_date = futures[future]
+            try:
+                processed = future.result()
+            except Exception as e:
+                self.logger.error("❌ Failed %s: %s", target_date, e)
+                processed = False
             
-            while retry_count < self.max_retries and not processed:
-                try:
-                    with app.app_context():
-                        # Clear any previous transaction state
-                        db.session.rollback()
-                        
-                        # Generate content for this date
-                        historical_provider = self._get_or_create_historical_provider()
-                        content = self.generator.generate_news_for_date(target_date)
-                        
-                        if not content or len(content) == 0:
-                            raise Exception("No content generated")
-                        
-                        # Create daily edition
-                        edition = DailyEdition(
+            (succeeded if processed else failed).add(target_date)
+        
+        return succeeded, failed
+    
+    def _process_one_date(self, target_date: date, generator) -> bool:
+        """Generate and store the edition for one date, retrying with backoff"""
+        retry_count = 0
+        processed = False
+        
+        while retry_count < self.max_retries and not processed:
+            try:
+                # Generate content before touching the DB so no connection is held meanwhile
+                provider_id = self._get_historical_provider_id()
+                content = generator.generate_news_for_date(target_date)
+                
+                if not content or len(content) == 0:
+                    raise Exception("No content generated")
+                
+                # Total duration is known up front, so the edition is inserted complete
+                total_duration = sum(article.get('duration', 180) for article in content)
+                
+                # Segment rows, completed with the edition id once it exists
+                rows = []
+                start_sec = 0
+                for idx, article in enumerate(content):
+                    duration_sec = article.get('duration', 180)
+                    rows.append({
+                        'provider_id': provider_id,
+                        'seq': idx + 1,
+                        'start_sec': start_sec,
+                        'duration_sec': duration_sec,
+                        'headline': article.get('title', f'News Article {idx + 1}')[:300],
+                        'region': article.get('region', 'global'),
+                        'category': article.get('category', 'general'),
+                        'transcript_text': article.get('transcript_text', ''),
+                        'segment_metadata': {'source_url': article.get('url', '')}
+                    })
+                    start_sec += duration_sec
+                
+                with app.app_context():
+                    # Create daily edition, getting its id back from the same INSERT
+                    edition_id = db.session.execute(
+                        self._edition_insert().values(
                             date=target_date,
-                            total_duration_seconds=18000,  # Exactly 5 hours
-                            segment_count=len(content),
-                            listener_count=0,
-                            completion_rate=0.0
-                        )
-                        
-                        db.session.add(edition)
-                        db.session.flush()  # Get edition ID
-                        
-                        # Create edition segments
-                        total_duration = 0
-                        for idx, article in enumerate(content):
-                            from models import EditionSegment
-                            
-                            segment = EditionSegment(
-                                edition_id=edition.id,
-                                provider_id=historical_provider.id,
-                                segment_order=idx + 1,
-                                title=article.get('title', f'News Article {idx + 1}'),
-                                content=article.get('content', ''),
-                                duration_seconds=article.get('duration_seconds', 180),
-                                source_url=article.get('source_url', ''),
-                                audio_file_path=None,
-                                tts_generated=False
-                            )
-                            
-                            total_duration += segment.duration_seconds
-                            db.session.add(segment)
-                        
-                        # Update edition with actual duration
-                        edition.total_duration_seconds = total_duration
+                            edition_number=1,
+                            title=f"International News - {target_date.strftime('%B %d, %Y')}",
+                            total_duration_sec=total_duration,
+                            status='ready'
+                        ).returning(DailyEdition.id)
+                    ).scalar_one_or_none()
+                    
+                    if edition_id is None:
+                        # Another worker or process already filled this date
+                        db.session.rollback()
+                        self.logger.debug("Edition for %s already exists, skipping", target_date)
+                    else:
+                        # Create edition segments in one executemany INSERT
+                        for row in rows:
+                            row['edition_id'] = edition_id
+                        db.session.execute(EditionSegment.__table__.insert(), rows)
                         
                         # Commit transaction
                         db.session.commit()
                         
-                        success_count += 1
-                        processed = True
-                        
-                        self.logger.debug(f"✅ Processed {target_date}: {len(content)} articles, {total_duration}s duration")
-                        
-                except Exception as e:
-                    retry_count += 1
-                    error_msg = str(e)
+                        self.logger.debug("✅ Processed %s: %d articles, %ds duration", target_date, len(content), total_duration)
                     
-                    # Clear failed transaction
-                    try:
-                        db.session.rollback()
-                    except:
-                        pass
+                processed = True
                     
-                    if retry_count < self.max_retries:
-                        # Exponential backoff
-                        delay = (2 ** retry_count) + random.uniform(0, 1)
-                        self.logger.warning(f"Retry {retry_count}/{self.max_retries} for {target_date}: {error_msg}")
-                        time.sleep(delay)
-                    else:
-                        error_count += 1
-                        self.logger.error(f"❌ Failed {target_date} after {retry_count} retries: {error_msg}")
+            except Exception as e:
+                retry_count += 1
+                error_msg = str(e)
+                
+                # Clear failed transaction
+                try:
+                    db.session.rollback()
+                except:
+                    pass
+                
+                if retry_count < self.max_retries:
+                    # Exponential backoff
+                    delay = (2 ** retry_count) + self._worker_rng().uniform(0, 1)
+                    self.logger.warning("Retry %d/%d for %s: %s", retry_count, self.max_retries, target_date, error_msg)
+                    if self.shutdown_event.wait(delay):
+                        break  # Shutting down; leave the date for the next run
+                else:
+                    self.logger.error("❌ Failed %s after %d retries: %s", target_date, retry_count, error_msg)
         
-        return success_count, error_count
+        return processed
     
     def _should_restart(self) -> bool:
         """Check if service should auto-restart"""
@@ -304,8 +397,8 @@ class PersistentBackfillService:
         self.stats['service_restarts'] += 1
         self.stats['last_restart'] = datetime.now()
         
-        # Small pause for resource cleanup
-        time.sleep(5)
+        # Small pause for resource cleanup, cut short on shutdown
+        self.shutdown_event.wait(5)
     
     def _perform_memory_cleanup(self):
         """Perform memory cleanup operations"""
@@ -318,23 +411,20 @@ class PersistentBackfillService:
             gc.collect()
             
             # Log memory usage
-            process = psutil.Process(os.getpid())
-            memory_mb = process.memory_info().rss / 1024 / 1024
-            self.logger.debug(f"Memory usage: {memory_mb:.1f} MB")
+            memory_mb = self._proc.memory_info().rss / 1024 / 1024
+            self.logger.debug("Memory usage: %.1f MB", memory_mb)
             
         except Exception as e:
-            self.logger.warning(f"Memory cleanup error: {e}")
+            self.logger.warning("Memory cleanup error: %s", e)
     
     def get_status(self) -> Dict:
         """Get current service status"""
         with app.app_context():
-            missing_dates = self._find_missing_dates()
+            missing_count = len(self._get_missing_dates())
             
             # Calculate completion stats
-            total_days_target = sum(366 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 365 
-                                  for year in self.target_years)
-            completed_days = total_days_target - len(missing_dates)
-            completion_percentage = (completed_days / total_days_target) * 100
+            completed_days = self._total_days_target - missing_count
+            completion_percentage = (completed_days / self._total_days_target) * 100
             
             uptime = datetime.now() - self.stats['start_time']
             
@@ -344,7 +434,7 @@ class PersistentBackfillService:
                 'total_processed': self.stats['total_processed'],
                 'total_errors': self.stats['total_errors'],
                 'service_restarts': self.stats['service_restarts'],
-                'missing_dates_count': len(missing_dates),
+                'missing_dates_count': missing_count,
                 'completion_percentage': completion_percentage,
                 'batch_size': self.batch_size,
                 'sleep_interval': self.sleep_between_batches
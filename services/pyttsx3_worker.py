@@ -0,0 +1,72 @@
+"""
+pyttsx3 Worker - Offline synthesis run inside a process pool
+
+Kept free of Flask/app imports so spawned worker processes start cheaply.
+Each worker process lazily creates and reuses its own pyttsx3 engine.
+"""
+import os
+import logging
+import tempfile
+from typing import Dict
+
+_engine = None
+
+
+def _get_engine(voice_props: Dict):
+    """Initialize this process's pyttsx3 engine with news anchor settings"""
+    global _engine
+    if _engine is None:
+        import pyttsx3
+
+        engine = pyttsx3.init()
+
+        # Prefer female voice for news anchor (usually more professional)
+        voices = engine.getProperty('voices')
+        if voices:
+            for voice in voices:
+                if 'female' in voice.name.lower() or 'woman' in voice.name.lower():
+                    engine.setProperty('voice', voice.id)
+                    break
+            else:
+                # Fallback to first available voice
+                engine.setProperty('voice', voices[0].id)
+
+        _engine = engine
+
+    # Set professional speaking rate and volume
+    _engine.setProperty('rate', voice_props.get('rate', 160))
+    _engine.setProperty('volume', voice_props.get('volume', 0.9))
+    return _engine
+
+
+def synthesize(text: str, output_path: str, voice_props: Dict) -> bool:
+    """Generate audio for text into output_path; returns True on success"""
+    logger = logging.getLogger(__name__)
+
+    try:
+        engine = _get_engine(voice_props)
+
+        # Render into a temp file in the destination directory so the final
+        # os.replace is an atomic same-filesystem rename
+        output_dir, output_name = os.path.split(str(output_path))
+        with tempfile.NamedTemporaryFile(delete=False, dir=output_dir or None,
+                                         suffix=os.path.splitext(output_name)[1]) as tmp:
+            temp_path = tmp.name
+
+        try:
+            engine.save_to_file(text, temp_path)
+            engine.runAndWait()
+
+            if os.path.getsize(temp_path) == 0:
+                logger.error(f"pyttsx3 produced no audio for {output_path}")
+                return False
+
+            os.replace(temp_path, output_path)
+            return True
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    except Exception as e:
+        logger.error(f"pyttsx3 audio generation failed: {e}")
+        return False
@@ -3,82 +3,399 @@ Real Content Providers for Historical International News
 Handles fetching actual content from BBC, Reuters, AP, and other international sources
 """
 
+import asyncio
+import functools
 import logging
+import sqlite3
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import feedparser
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Optional, Tuple
+from types import MappingProxyType
+from typing import Any, List, Dict, Mapping, Optional, Set, Tuple
 import time
 import re
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
-import json
+import lxml.html
+from sqlalchemy import insert
+from lxml import etree
 
 from app import db
 from models import ContentSource, ProviderSource
 
+_WS_RE = re.compile(r'\s+')
+
+_UNWANTED_TAGS = ('script', 'style', 'nav', 'header', 'footer', 'aside')
+
+
+# Main content candidates in priority order: (tag, class, role) a node must match
+_MAIN_CONTENT_PRIORITY = (
+    ('article', None, None), (None, 'article-body', None), (None, 'story-body', None), (None, 'content', None),
+    ('main', None, None), (None, 'main-content', None), (None, 'post-content', None), ('div', None, 'main'),
+    ('body', None, None)
+)
+
+
+def _has_class_xpath(class_name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+# Every candidate node of the page in one compiled walk
+_MAIN_CONTENT_XPATH = etree.XPath(
+    "//article | //main | //body | //div[@role='main'] | //*[@class][" + ' or '.join(
+        _has_class_xpath(class_name) for _, class_name, _ in _MAIN_CONTENT_PRIORITY if class_name
+    ) + "]"
+)
+
+
+def _content_rank(node) -> int:
+    """Position of the best candidate rule a node matches in _MAIN_CONTENT_PRIORITY"""
+    classes = set(node.get('class', '').split())
+    for rank, (tag, class_name, role) in enumerate(_MAIN_CONTENT_PRIORITY):
+        if ((tag is None or node.tag == tag) and (class_name is None or class_name in classes)
+                and (role is None or node.get('role') == role)):
+            return rank
+    return len(_MAIN_CONTENT_PRIORITY)
+
+
+class _DomainRateLimiter:
+    """Per-host pacing: at most max_rate requests per second to any one host, hosts never wait on each other"""
+    
+    def __init__(self, max_rate: float):
+        self.interval = 1.0 / max_rate
+        self._last: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+    
+    async def wait(self, host: str):
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            delay = self._last.get(host, 0.0) + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last[host] = time.monotonic()
+    
+    async def on_request_start(self, session, trace_config_ctx, params: aiohttp.TraceRequestStartParams):
+        await self.wait(params.url.host)
+
 
 class RealContentProvider:
     """Base class for real content providers"""
     
+    # Concurrent fetches overall and per news site (the per-host cap keeps us polite)
+    FETCH_CONCURRENCY = 32
+    FETCH_PER_HOST = 4
+    FETCH_HOST_RATE = 5.0  # Requests per second to one host
+    FETCH_TIMEOUT = 30
+    ARTICLE_MAX_BYTES = 200_000  # Far more HTML than the 5000 chars of text we keep
+    
+    # Per-provider settings; subclasses fill these in along with rss_feeds
+    FEED_LABEL = ''  # Short name used in log messages
+    SOURCE_KEY = ''  # content_metadata['source'] of stored items
+    DEFAULT_TOPIC = 'World News'
+    # (feed URL substring, category) pairs checked in order
+    CATEGORY_TABLE: Tuple[Tuple[str, str], ...] = ()
+    DEFAULT_CATEGORY = 'world'
+    RSS_FEEDS: Tuple[str, ...] = ()
+    
+    # ETag/Last-Modified and body of each feed, so unchanged feeds come back as an empty 304
+    FEED_CACHE_PATH = 'feed_cache.sqlite'
+    
     def __init__(self, provider_name: str, base_url: str):
         self.provider_name = provider_name
         self.base_url = base_url
         self.logger = logging.getLogger(f"{__name__}.{provider_name}")
+        self.rss_feeds = list(self.RSS_FEEDS)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (compatible; TOEFL Practice Bot/1.0)'
         })
+        # Keep connections to each news site alive and retry transient failures with backoff
+        adapter = HTTPAdapter(
+            pool_connections=20, pool_maxsize=50,
+            max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     
     def fetch_content_for_date(self, target_date: date) -> List[Dict]:
-        """Fetch content for a specific date. Override in subclasses."""
-        raise NotImplementedError
+        """Fetch content for a specific date"""
+        return asyncio.run(self._fetch_with_own_session(target_date))
     
-    def extract_text_content(self, url: str) -> Optional[str]:
-        """Extract text content from a URL"""
-        try:
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
+    async def _fetch_with_own_session(self, target_date: date) -> List[Dict]:
+        async with self.client_session() as session:
+            return await self.afetch_content_for_date(target_date, session)
+    
+    async def afetch_content_for_date(self, target_date: date, session: aiohttp.ClientSession,
+                                      known_urls: Optional[Set[str]] = None) -> List[Dict]:
+        """Fetch this provider's RSS articles for a specific date on a shared session.
+        
+        Entries whose link is in known_urls are already stored and are not downloaded again.
+        """
+        known_urls = known_urls or set()
+        # ±1 day tolerance for historical content
+        window_start = target_date - timedelta(days=1)
+        window_end = target_date + timedelta(days=1)
+        candidates = []
+        
+        for feed_url, feed in await self._afetch_feeds(session):
+            try:
+                for entry in feed.entries:
+                    # Parse published date
+                    pub_date = self._entry_date(entry)
+                    if pub_date is None:
+                        continue
+                    
+                    # Feeds list newest first, so everything after this is older still
+                    if pub_date < window_start:
+                        break
+                    if pub_date > window_end:
+                        continue
+                    
+                    if entry.link not in known_urls:
+                        candidates.append((feed_url, entry, pub_date, entry.link))
+                
+            except Exception as e:
+                self.logger.error("Error reading %s feed %s: %s", self.FEED_LABEL, feed_url, e)
+        
+        # Extract every in-window article concurrently
+        texts = await asyncio.gather(*(self.aextract_text_content(session, link) for *_, link in candidates))
+        
+        # Category depends only on the feed, so look it up once per feed
+        categories = {feed_url: self._extract_category_from_feed(feed_url) for feed_url in self.rss_feeds}
+        
+        content_items = []
+        for (feed_url, entry, pub_date, _), text_content in zip(candidates, texts):
+            if not text_content:
+                continue
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # Extracted text is single-spaced, so counting spaces counts words
+            word_count = text_content.count(' ') + 1
+            if word_count > 50:  # At least 50 words
+                
+                duration = self.estimate_duration_from_wc(word_count)
+                
+                content_item = {
+                    'name': self.provider_name,
+                    'url': entry.link,
+                    'type': 'news',
+                    'language': 'en',
+                    'duration': duration,
+                    'description': entry.title,
+                    'topic': entry.get('category', self.DEFAULT_TOPIC),
+                    'category': categories[feed_url],
+                    'published_date': datetime.combine(pub_date, datetime.min.time()),
+                    'transcript_text': text_content,
+                    'region': 'global',
+                    'content_metadata': {
+                        'source': self.SOURCE_KEY,
+                        'feed_url': feed_url,
+                        'original_title': entry.title,
+                        'summary': entry.get('summary', '')[:500]
+                    }
+                }
+                content_items.append(content_item)
+        
+        self.logger.info("Found %d %s articles for %s", len(content_items), self.FEED_LABEL, target_date)
+        return content_items
+    
+    @classmethod
+    def client_session(cls) -> aiohttp.ClientSession:
+        """HTTP session shared by all feed and article fetches of one run; every request is paced per host"""
+        connector = aiohttp.TCPConnector(limit=cls.FETCH_CONCURRENCY, limit_per_host=cls.FETCH_PER_HOST,
+                                         ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=cls.FETCH_TIMEOUT)
+        headers = {'User-Agent': 'Mozilla/5.0 (compatible; TOEFL Practice Bot/1.0)'}
+        
+        limiter = _DomainRateLimiter(cls.FETCH_HOST_RATE)
+        pacing = aiohttp.TraceConfig()
+        pacing.on_request_start.append(limiter.on_request_start)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers, trace_configs=[pacing])
+    
+    async def _afetch(self, session: aiohttp.ClientSession, url: str, max_bytes: Optional[int] = None) -> bytes:
+        """GET a URL and return the response body, stopping after max_bytes if given"""
+        async with session.get(url) as response:
+            response.raise_for_status()
+            if max_bytes is None:
+                return await response.read()
             
-            # Remove unwanted elements
-            for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside']):
-                element.decompose()
+            chunks = []
+            remaining = max_bytes
+            while remaining > 0:
+                chunk = await response.content.read(remaining)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                remaining -= len(chunk)
+            return b''.join(chunks)
+    
+    async def _afetch_feed(self, session: aiohttp.ClientSession, feed_url: str,
+                           cached: Optional[Tuple[Optional[str], Optional[str], bytes]]) -> Tuple[bytes, Optional[Tuple[Optional[str], Optional[str]]]]:
+        """Conditional GET of a feed; returns the body and, when it was downloaded, its new ETag/Last-Modified"""
+        headers = {}
+        if cached:
+            etag, modified, _ = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if modified:
+                headers['If-Modified-Since'] = modified
+        
+        async with session.get(feed_url, headers=headers) as response:
+            if response.status == 304 and cached:
+                # Unchanged: re-parse the cached body so entries skipped or failed last time are seen again
+                return cached[2], None
+            response.raise_for_status()
+            return await response.read(), (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    
+    async def _afetch_feeds(self, session: aiohttp.ClientSession) -> List[Tuple[str, Any]]:
+        """Download all changed RSS feeds concurrently and parse them; failed feeds are logged and skipped"""
+        if self.logger.isEnabledFor(logging.INFO):
+            for feed_url in self.rss_feeds:
+                self.logger.info("Fetching %s feed: %s", self.provider_name, feed_url)
+        
+        cached_feeds = self._load_cached_feeds(self.rss_feeds)
+        results = await asyncio.gather(
+            *(self._afetch_feed(session, feed_url, cached_feeds.get(feed_url)) for feed_url in self.rss_feeds),
+            return_exceptions=True
+        )
+        
+        feeds = []
+        fresh_feeds = []
+        for feed_url, result in zip(self.rss_feeds, results):
+            if isinstance(result, BaseException):
+                self.logger.error("Error fetching %s feed %s: %s", self.provider_name, feed_url, result)
+                continue
             
-            # Find main content area
-            content_selectors = [
-                'article', '.article-body', '.story-body', '.content',
-                'main', '.main-content', '.post-content', 'div[role="main"]'
-            ]
+            body, validators = result
+            if validators is None:
+                self.logger.info("%s feed unchanged: %s", self.provider_name, feed_url)
+            else:
+                fresh_feeds.append((feed_url, *validators, body, time.time()))
+            # Parse the downloaded bytes so feedparser never does its own blocking fetch
+            feeds.append((feed_url, feedparser.parse(body)))
+        
+        self._save_cached_feeds(fresh_feeds)
+        return feeds
+    
+    def _open_feed_cache(self) -> sqlite3.Connection:
+        """Open the feed cache"""
+        conn = sqlite3.connect(self.FEED_CACHE_PATH)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS feed_bodies "
+            "(url TEXT PRIMARY KEY, etag TEXT, modified TEXT, body BLOB NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        return conn
+    
+    def _load_cached_feeds(self, feed_urls: List[str]) -> Dict[str, Tuple[Optional[str], Optional[str], bytes]]:
+        """ETag/Last-Modified and last downloaded body of the given feeds"""
+        if not feed_urls:
+            return {}
+        cache = self._open_feed_cache()
+        try:
+            rows = cache.execute(
+                "SELECT url, etag, modified, body FROM feed_bodies WHERE url IN (%s)" % ", ".join("?" * len(feed_urls)),
+                feed_urls
+            ).fetchall()
+        finally:
+            cache.close()
+        return {url: (etag, modified, body) for url, etag, modified, body in rows}
+    
+    def _save_cached_feeds(self, rows: List[Tuple[str, Optional[str], Optional[str], bytes, float]]):
+        """Record validators and bodies of freshly downloaded feeds"""
+        if not rows:
+            return
+        cache = self._open_feed_cache()
+        try:
+            with cache:
+                cache.executemany(
+                    "INSERT OR REPLACE INTO feed_bodies (url, etag, modified, body, fetched_at) VALUES (?, ?, ?, ?, ?)", rows
+                )
+        finally:
+            cache.close()
+    
+    async def aextract_text_content(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
+        """Extract text content from a URL on a shared session"""
+        try:
+            content = await self._afetch(session, url, self.ARTICLE_MAX_BYTES)
+        except Exception as e:
+            self.logger.error("Error extracting text from %s: %s", url, e)
+            return None
+        
+        return self._extract_text_from_html(url, content)
+    
+    def extract_text_content(self, url: str) -> Optional[str]:
+        """Extract text content from a URL"""
+        try:
+            with self.session.get(url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                content = response.raw.read(self.ARTICLE_MAX_BYTES, decode_content=True)
+        except Exception as e:
+            self.logger.error("Error extracting text from %s: %s", url, e)
+            return None
+        
+        return self._extract_text_from_html(url, content)
+    
+    def _extract_text_from_html(self, url: str, content: bytes) -> Optional[str]:
+        """Pull the main article text out of an HTML page"""
+        try:
+            tree = lxml.html.fromstring(content)
             
-            main_content = None
-            for selector in content_selectors:
-                main_content = soup.select_one(selector)
-                if main_content:
-                    break
+            # Remove unwanted elements in one pass
+            etree.strip_elements(tree, *_UNWANTED_TAGS, with_tail=False)
             
-            if not main_content:
-                main_content = soup.find('body')
+            # Find main content area, falling back to the whole body; min() keeps
+            # document order among equally ranked candidates
+            candidates = _MAIN_CONTENT_XPATH(tree)
+            main_content = min(candidates, key=_content_rank) if candidates else None
             
-            if main_content:
+            if main_content is not None:
                 # Get text and clean it
-                text = main_content.get_text(separator=' ', strip=True)
+                text = ' '.join(piece.strip() for piece in main_content.itertext() if piece.strip())
                 # Clean multiple spaces and newlines
-                text = re.sub(r'\s+', ' ', text)
+                text = _WS_RE.sub(' ', text)
                 return text[:5000] if text else None  # Limit to 5000 chars
             
         except Exception as e:
-            self.logger.error(f"Error extracting text from {url}: {e}")
+            self.logger.error("Error extracting text from %s: %s", url, e)
+        
+        return None
+    
+    @staticmethod
+    def _entry_date(entry) -> Optional[date]:
+        """Published date of a feed entry, or None when it has no readable date"""
+        parsed = entry.get('published_parsed')
+        if parsed:
+            return date(*parsed[:3])
         
+        published = entry.get('published')
+        if published:
+            try:
+                return date.fromisoformat(published[:10])
+            except ValueError:
+                return None
         return None
     
+    def _extract_category_from_feed(self, feed_url: str) -> str:
+        """Extract category from feed URL"""
+        category = CATEGORY_BY_FEED.get(feed_url)
+        return category if category is not None else self._scan_category(feed_url)
+    
+    @classmethod
+    def _scan_category(cls, feed_url: str) -> str:
+        """Match a feed URL against CATEGORY_TABLE"""
+        return next((category for key, category in cls.CATEGORY_TABLE if key in feed_url), cls.DEFAULT_CATEGORY)
+    
     def estimate_duration(self, text: str) -> int:
-        """Estimate reading duration based on text length (180 words per minute)"""
+        """Estimate reading duration of single-spaced text (180 words per minute)"""
         if not text:
             return 0
         
-        word_count = len(text.split())
+        return self.estimate_duration_from_wc(text.count(' ') + 1)
+    
+    @staticmethod
+    def estimate_duration_from_wc(word_count: int) -> int:
+        """Estimate reading duration from a word count (180 words per minute)"""
         # Assume 180 words per minute reading speed
         minutes = word_count / 180
         return max(60, int(minutes * 60))  # At least 1 minute
@@ -87,253 +404,66 @@ class RealContentProvider:
 class BBCWorldServiceProvider(RealContentProvider):
     """BBC World Service content provider"""
     
-    def __init__(self):
-        super().__init__("BBC World Service", "https://www.bbc.com")
-        self.rss_feeds = [
-            "http://feeds.bbci.co.uk/news/world/rss.xml",
-            "http://feeds.bbci.co.uk/news/business/rss.xml",
-            "http://feeds.bbci.co.uk/news/politics/rss.xml",
-            "http://feeds.bbci.co.uk/news/technology/rss.xml"
-        ]
+    FEED_LABEL = 'BBC'
+    SOURCE_KEY = 'bbc_rss'
+    CATEGORY_TABLE = (('business', 'business'), ('politics', 'politics'), ('technology', 'technology'))
     
-    def fetch_content_for_date(self, target_date: date) -> List[Dict]:
-        """Fetch BBC content for a specific date"""
-        content_items = []
-        
-        for feed_url in self.rss_feeds:
-            try:
-                self.logger.info(f"Fetching BBC feed: {feed_url}")
-                
-                feed = feedparser.parse(feed_url)
-                
-                for entry in feed.entries:
-                    # Parse published date
-                    try:
-                        if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                            pub_date = datetime(*entry.published_parsed[:6]).date()
-                        elif hasattr(entry, 'published'):
-                            pub_date = datetime.strptime(entry.published[:10], '%Y-%m-%d').date()
-                        else:
-                            continue
-                    except:
-                        continue
-                    
-                    # Check if it's from our target date (±1 day tolerance for historical content)
-                    date_diff = abs((pub_date - target_date).days)
-                    if date_diff <= 1:
-                        
-                        # Extract text content
-                        text_content = self.extract_text_content(entry.link)
-                        if text_content and len(text_content.split()) > 50:  # At least 50 words
-                            
-                            duration = self.estimate_duration(text_content)
-                            
-                            content_item = {
-                                'name': 'BBC World Service',
-                                'url': entry.link,
-                                'type': 'news',
-                                'language': 'en',
-                                'duration': duration,
-                                'description': entry.title,
-                                'topic': getattr(entry, 'category', 'World News'),
-                                'category': self._extract_category_from_feed(feed_url),
-                                'published_date': datetime.combine(pub_date, datetime.min.time()),
-                                'transcript_text': text_content,
-                                'region': 'global',
-                                'content_metadata': {
-                                    'source': 'bbc_rss',
-                                    'feed_url': feed_url,
-                                    'original_title': entry.title,
-                                    'summary': getattr(entry, 'summary', '')[:500]
-                                }
-                            }
-                            content_items.append(content_item)
-                
-                # Be respectful to BBC servers
-                time.sleep(1)
-                
-            except Exception as e:
-                self.logger.error(f"Error fetching BBC feed {feed_url}: {e}")
-        
-        self.logger.info(f"Found {len(content_items)} BBC articles for {target_date}")
-        return content_items
+    RSS_FEEDS = (
+        "http://feeds.bbci.co.uk/news/world/rss.xml",
+        "http://feeds.bbci.co.uk/news/business/rss.xml",
+        "http://feeds.bbci.co.uk/news/politics/rss.xml",
+        "http://feeds.bbci.co.uk/news/technology/rss.xml",
+    )
     
-    def _extract_category_from_feed(self, feed_url: str) -> str:
-        """Extract category from feed URL"""
-        if 'business' in feed_url:
-            return 'business'
-        elif 'politics' in feed_url:
-            return 'politics'
-        elif 'technology' in feed_url:
-            return 'technology'
-        else:
-            return 'world'
+    def __init__(self):
+        super().__init__("BBC World Service", "https://www.bbc.com")
 
 
 class ReutersProvider(RealContentProvider):
     """Reuters content provider"""
     
-    def __init__(self):
-        super().__init__("Reuters International", "https://www.reuters.com")
-        self.rss_feeds = [
-            "https://feeds.reuters.com/reuters/worldNews",
-            "https://feeds.reuters.com/reuters/businessNews",
-            "https://feeds.reuters.com/reuters/politicsNews",
-            "https://feeds.reuters.com/reuters/technologyNews"
-        ]
+    FEED_LABEL = 'Reuters'
+    SOURCE_KEY = 'reuters_rss'
+    DEFAULT_TOPIC = 'International News'
+    CATEGORY_TABLE = (('business', 'business'), ('politics', 'politics'), ('technology', 'technology'))
     
-    def fetch_content_for_date(self, target_date: date) -> List[Dict]:
-        """Fetch Reuters content for a specific date"""
-        content_items = []
-        
-        for feed_url in self.rss_feeds:
-            try:
-                self.logger.info(f"Fetching Reuters feed: {feed_url}")
-                
-                feed = feedparser.parse(feed_url)
-                
-                for entry in feed.entries:
-                    # Parse published date
-                    try:
-                        if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                            pub_date = datetime(*entry.published_parsed[:6]).date()
-                        else:
-                            continue
-                    except:
-                        continue
-                    
-                    # Check if it's from our target date (±1 day tolerance)
-                    date_diff = abs((pub_date - target_date).days)
-                    if date_diff <= 1:
-                        
-                        # Extract text content
-                        text_content = self.extract_text_content(entry.link)
-                        if text_content and len(text_content.split()) > 50:
-                            
-                            duration = self.estimate_duration(text_content)
-                            
-                            content_item = {
-                                'name': 'Reuters International',
-                                'url': entry.link,
-                                'type': 'news',
-                                'language': 'en',
-                                'duration': duration,
-                                'description': entry.title,
-                                'topic': getattr(entry, 'category', 'International News'),
-                                'category': self._extract_category_from_feed(feed_url),
-                                'published_date': datetime.combine(pub_date, datetime.min.time()),
-                                'transcript_text': text_content,
-                                'region': 'global',
-                                'content_metadata': {
-                                    'source': 'reuters_rss',
-                                    'feed_url': feed_url,
-                                    'original_title': entry.title,
-                                    'summary': getattr(entry, 'summary', '')[:500]
-                                }
-                            }
-                            content_items.append(content_item)
-                
-                time.sleep(1)  # Be respectful
-                
-            except Exception as e:
-                self.logger.error(f"Error fetching Reuters feed {feed_url}: {e}")
-        
-        self.logger.info(f"Found {len(content_items)} Reuters articles for {target_date}")
-        return content_items
+    RSS_FEEDS = (
+        "https://feeds.reuters.com/reuters/worldNews",
+        "https://feeds.reuters.com/reuters/businessNews",
+        "https://feeds.reuters.com/reuters/politicsNews",
+        "https://feeds.reuters.com/reuters/technologyNews",
+    )
     
-    def _extract_category_from_feed(self, feed_url: str) -> str:
-        """Extract category from feed URL"""
-        if 'business' in feed_url:
-            return 'business'
-        elif 'politics' in feed_url:
-            return 'politics'
-        elif 'technology' in feed_url:
-            return 'technology'
-        else:
-            return 'world'
+    def __init__(self):
+        super().__init__("Reuters International", "https://www.reuters.com")
 
 
 class APNewsProvider(RealContentProvider):
     """Associated Press News provider"""
     
-    def __init__(self):
-        super().__init__("AP News International", "https://apnews.com")
-        self.rss_feeds = [
-            "https://feeds.apnews.com/rss/apf-intlnews",
-            "https://feeds.apnews.com/rss/apf-topnews",
-            "https://feeds.apnews.com/rss/apf-business",
-            "https://feeds.apnews.com/rss/apf-politics"
-        ]
+    FEED_LABEL = 'AP News'
+    SOURCE_KEY = 'ap_rss'
+    DEFAULT_TOPIC = 'Breaking News'
+    CATEGORY_TABLE = (('business', 'business'), ('politics', 'politics'), ('intlnews', 'international'))
+    DEFAULT_CATEGORY = 'news'
     
-    def fetch_content_for_date(self, target_date: date) -> List[Dict]:
-        """Fetch AP News content for a specific date"""
-        content_items = []
-        
-        for feed_url in self.rss_feeds:
-            try:
-                self.logger.info(f"Fetching AP News feed: {feed_url}")
-                
-                feed = feedparser.parse(feed_url)
-                
-                for entry in feed.entries:
-                    # Parse published date
-                    try:
-                        if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                            pub_date = datetime(*entry.published_parsed[:6]).date()
-                        else:
-                            continue
-                    except:
-                        continue
-                    
-                    # Check if it's from our target date (±1 day tolerance)
-                    date_diff = abs((pub_date - target_date).days)
-                    if date_diff <= 1:
-                        
-                        # Extract text content
-                        text_content = self.extract_text_content(entry.link)
-                        if text_content and len(text_content.split()) > 50:
-                            
-                            duration = self.estimate_duration(text_content)
-                            
-                            content_item = {
-                                'name': 'AP News International',
-                                'url': entry.link,
-                                'type': 'news',
-                                'language': 'en',
-                                'duration': duration,
-                                'description': entry.title,
-                                'topic': getattr(entry, 'category', 'Breaking News'),
-                                'category': self._extract_category_from_feed(feed_url),
-                                'published_date': datetime.combine(pub_date, datetime.min.time()),
-                                'transcript_text': text_content,
-                                'region': 'global',
-                                'content_metadata': {
-                                    'source': 'ap_rss',
-                                    'feed_url': feed_url,
-                                    'original_title': entry.title,
-                                    'summary': getattr(entry, 'summary', '')[:500]
-                                }
-                            }
-                            content_items.append(content_item)
-                
-                time.sleep(1)  # Be respectful
-                
-            except Exception as e:
-                self.logger.error(f"Error fetching AP News feed {feed_url}: {e}")
-        
-        self.logger.info(f"Found {len(content_items)} AP News articles for {target_date}")
-        return content_items
+    RSS_FEEDS = (
+        "https://feeds.apnews.com/rss/apf-intlnews",
+        "https://feeds.apnews.com/rss/apf-topnews",
+        "https://feeds.apnews.com/rss/apf-business",
+        "https://feeds.apnews.com/rss/apf-politics",
+    )
     
-    def _extract_category_from_feed(self, feed_url: str) -> str:
-        """Extract category from feed URL"""
-        if 'business' in feed_url:
-            return 'business'
-        elif 'politics' in feed_url:
-            return 'politics'
-        elif 'intlnews' in feed_url:
-            return 'international'
-        else:
-            return 'news'
+    def __init__(self):
+        super().__init__("AP News International", "https://apnews.com")
+
+
+# Category of every built-in feed, worked out once at import
+CATEGORY_BY_FEED: Mapping[str, str] = MappingProxyType({
+    feed_url: provider_cls._scan_category(feed_url)
+    for provider_cls in (BBCWorldServiceProvider, ReutersProvider, APNewsProvider)
+    for feed_url in provider_cls.RSS_FEEDS
+})
 
 
 class RealContentOrchestrator:
@@ -349,18 +479,14 @@ class RealContentOrchestrator:
     
     def fetch_content_for_date(self, target_date: date) -> List[Dict]:
         """Fetch content from all providers for a specific date"""
-        all_content = []
+        # Articles stored around this date need no second download
+        known_urls = {
+            url for (url,) in db.session.query(ContentSource.url).filter(
+                ContentSource.published_date >= target_date - timedelta(days=2)
+            )
+        }
         
-        for provider in self.providers:
-            try:
-                provider_content = provider.fetch_content_for_date(target_date)
-                all_content.extend(provider_content)
-                
-                # Short delay between providers
-                time.sleep(2)
-                
-            except Exception as e:
-                self.logger.error(f"Error with provider {provider.provider_name}: {e}")
+        all_content = asyncio.run(self._afetch_all_providers(target_date, known_urls))
         
         # Remove duplicates based on URL
         seen_urls = set()
@@ -370,73 +496,107 @@ class RealContentOrchestrator:
                 seen_urls.add(item['url'])
                 unique_content.append(item)
         
-        self.logger.info(f"Fetched {len(unique_content)} unique articles for {target_date}")
+        self.logger.info("Fetched %d unique articles for %s", len(unique_content), target_date)
         return unique_content
     
+    async def _afetch_all_providers(self, target_date: date, known_urls: Set[str]) -> List[Dict]:
+        """Run every provider concurrently on one shared HTTP session"""
+        async with RealContentProvider.client_session() as session:
+            results = await asyncio.gather(
+                *(provider.afetch_content_for_date(target_date, session, known_urls) for provider in self.providers),
+                return_exceptions=True
+            )
+        
+        all_content = []
+        for provider, result in zip(self.providers, results):
+            if isinstance(result, BaseException):
+                self.logger.error("Error with provider %s: %s", provider.provider_name, result)
+            else:
+                all_content.extend(result)
+        return all_content
+    
     def save_content_to_database(self, content_items: List[Dict]) -> int:
         """Save content items to database"""
-        saved_count = 0
+        new_rows = []
+        
+        # One query for every URL of the batch that is already stored
+        urls = [item.get('url') for item in content_items]
+        known_urls = {
+            url for (url,) in db.session.query(ContentSource.url).filter(ContentSource.url.in_(urls))
+        } if urls else set()
         
         for item in content_items:
             try:
-                # Check if content already exists
-                existing = ContentSource.query.filter_by(url=item['url']).first()
-                if existing:
+                # Skip stored content and repeats within this batch
+                if item['url'] in known_urls:
                     continue
+                known_urls.add(item['url'])
                 
-                # Create new content source
-                content = ContentSource()
-                content.name = item['name']
-                content.url = item['url']
-                content.type = item['type']
-                content.language = item['language']
-                content.duration = item['duration']
-                content.description = item['description']
-                content.topic = item['topic']
-                content.category = item['category']
-                content.published_date = item['published_date']
-                content.transcript_text = item['transcript_text']
-                content.region = item.get('region', 'global')
-                content.content_metadata = json.dumps(item['content_metadata'])
-                
-                db.session.add(content)
-                saved_count += 1
+                new_rows.append({
+                    'name': item['name'],
+                    'url': item['url'],
+                    'type': item['type'],
+                    'language': item['language'],
+                    'duration': item['duration'],
+                    'description': item['description'],
+                    'topic': item['topic'],
+                    'category': item['category'],
+                    'published_date': item['published_date'],
+                    'transcript_text': item['transcript_text'],
+                    'region': item.get('region', 'global'),
+                    'content_metadata': item['content_metadata'],
+                })
                 
             except Exception as e:
-                self.logger.error(f"Error saving content item: {e}")
+                self.logger.error("Error saving content item: %s", e)
+        
+        saved_count = len(new_rows)
+        if not new_rows:
+            return 0
         
         try:
+            # Core executemany insert; no ORM objects are needed since nothing reads the new ids
+            db.session.execute(insert(ContentSource), new_rows)
             db.session.commit()
-            self.logger.info(f"Saved {saved_count} new content items to database")
+            self.logger.info("Saved %d new content items to database", saved_count)
         except Exception as e:
             db.session.rollback()
-            self.logger.error(f"Error committing content to database: {e}")
+            self.logger.error("Error committing content to database: %s", e)
             saved_count = 0
         
         return saved_count
 
 
+@functools.lru_cache(maxsize=1)
+def _historical_generator():
+    """Shared HistoricalNewsGenerator; it keeps no per-call state"""
+    from services.historical_news_generator import HistoricalNewsGenerator
+    return HistoricalNewsGenerator()
+
+
+@functools.lru_cache(maxsize=1)
+def _edition_composer():
+    """Shared DailyEditionComposer, imported on first use since it imports this module"""
+    from services.daily_edition_composer import DailyEditionComposer
+    return DailyEditionComposer()
+
+
 # Convenience function for route usage
 def fetch_real_content_for_date(target_date: date) -> Dict[str, any]:
     """Fetch and save real content for a specific date"""
-    from datetime import date as date_class
-    today = date_class.today()
+    today = date.today()
     
     # If target_date is historical (before today), use historical generator
     if target_date < today:
-        logging.getLogger(__name__).info(f"Using historical news generator for {target_date}")
-        from services.historical_news_generator import HistoricalNewsGenerator
-        generator = HistoricalNewsGenerator()
-        articles = generator.generate_news_for_date(target_date)
+        logging.getLogger(__name__).info("Using historical news generator for %s", target_date)
+        articles = _historical_generator().generate_news_for_date(target_date)
         
         # Save to database using orchestrator
         orchestrator = RealContentOrchestrator()
         saved_count = orchestrator.save_content_to_database(articles)
         
         # After saving content, compose daily edition
-        from services.daily_edition_composer import DailyEditionComposer
-        composer = DailyEditionComposer()
-        composition_result = composer.compose_daily_edition(target_date)
+        composition_result = _edition_composer().compose_daily_edition(target_date)
         
         return {
             'status': 'success',
@@ -466,7 +626,7 @@ def fetch_real_content_for_date(target_date: date) -> Dict[str, any]:
         }
         
     except Exception as e:
-        logging.error(f"Error in fetch_real_content_for_date: {e}")
+        logging.error("Error in fetch_real_content_for_date: %s", e)
         return {
             'status': 'error',
             'date': target_date,
@@ -1,5 +1,8 @@
 import logging
-from typing import Dict, List
+from collections import defaultdict
+from typing import Dict, List, Tuple
+import numpy as np
+from app import db
 from models import Answer, Question, PracticeSession
 
 class ScoringEngine:
@@ -8,22 +11,29 @@ class ScoringEngine:
     def analyze_performance(self, practice_session: PracticeSession) -> Dict:
         """Analyze user performance and provide detailed feedback"""
         try:
-            answers = Answer.query.filter_by(session_id=practice_session.id).all()
+            # Answers with their questions in one JOIN instead of a lookup per answer
+            pairs = db.session.query(Answer, Question).join(
+                Question, Answer.question_id == Question.id
+            ).filter(Answer.session_id == practice_session.id).all()
+            
+            # Every per-answer statistic gathered in one pass, shared by the analyses below
+            stats = self._aggregate(pairs)
+            correct, times = stats['correct'], stats['times']
             
             # Calculate basic metrics
-            total_questions = len(answers)
-            correct_answers = sum(1 for a in answers if a.is_correct)
-            accuracy = (correct_answers / total_questions * 100) if total_questions > 0 else 0
+            total_questions = int(correct.size)
+            correct_answers = int(correct.sum())
+            accuracy = float(correct.mean() * 100) if total_questions > 0 else 0
             
             # Analyze by question type
-            question_type_analysis = self._analyze_by_question_type(answers)
+            question_type_analysis = self._analyze_by_question_type(stats['type_stats'])
             
             # Analyze timing patterns
-            timing_analysis = self._analyze_timing(answers)
+            timing_analysis = self._analyze_timing(times)
             
             # Identify strengths and weaknesses
-            strengths = self._identify_strengths(answers, accuracy)
-            weaknesses = self._identify_weaknesses(answers, accuracy)
+            strengths = self._identify_strengths(stats['type_stats'], accuracy, times)
+            weaknesses = self._identify_weaknesses(correct, accuracy, times)
             
             # Generate recommendations
             recommendations = self._generate_recommendations(strengths, weaknesses, timing_analysis)
@@ -46,44 +56,57 @@ class ScoringEngine:
             logging.error(f"Error analyzing performance: {e}")
             return self._generate_default_feedback()
     
-    def _analyze_by_question_type(self, answers: List[Answer]) -> Dict:
-        """Analyze performance by question type"""
-        type_stats = {}
-        
-        for answer in answers:
-            question = Question.query.get(answer.question_id)
-            q_type = question.question_type
-            
-            if q_type not in type_stats:
-                type_stats[q_type] = {'total': 0, 'correct': 0}
+    def _aggregate(self, pairs: List[Tuple[Answer, Question]]) -> Dict:
+        """Collect correctness, answer times and per-type counts in a single pass"""
+        correct_flags = []
+        times = []
+        type_stats = defaultdict(lambda: {'total': 0, 'correct': 0})
+        
+        for answer, question in pairs:
+            is_correct = bool(answer.is_correct)
+            correct_flags.append(is_correct)
+            if answer.time_taken:
+                times.append(answer.time_taken)
             
-            type_stats[q_type]['total'] += 1
-            if answer.is_correct:
-                type_stats[q_type]['correct'] += 1
+            q_stats = type_stats[question.question_type]
+            q_stats['total'] += 1
+            q_stats['correct'] += is_correct
+        
+        return {
+            'correct': np.array(correct_flags, dtype=bool),
+            'times': np.array(times, dtype=np.int64),
+            'type_stats': dict(type_stats)
+        }
+    
+    def _analyze_by_question_type(self, type_stats: Dict) -> Dict:
+        """Analyze performance by question type"""
+        analysis = {}
         
         # Calculate accuracy for each type
-        for q_type in type_stats:
-            total = type_stats[q_type]['total']
-            correct = type_stats[q_type]['correct']
-            type_stats[q_type]['accuracy'] = (correct / total * 100) if total > 0 else 0
+        for q_type, counts in type_stats.items():
+            total = counts['total']
+            correct = counts['correct']
+            analysis[q_type] = {
+                'total': total,
+                'correct': correct,
+                'accuracy': (correct / total * 100) if total > 0 else 0
+            }
         
-        return type_stats
+        return analysis
     
-    def _analyze_timing(self, answers: List[Answer]) -> Dict:
+    def _analyze_timing(self, times: np.ndarray) -> Dict:
         """Analyze timing patterns"""
-        times = [a.time_taken for a in answers if a.time_taken]
-        
-        if not times:
+        if not times.size:
             return {'average_time': 0, 'fastest': 0, 'slowest': 0}
         
         return {
-            'average_time': sum(times) / len(times),
-            'fastest': min(times),
-            'slowest': max(times),
-            'total_time': sum(times)
+            'average_time': float(times.mean()),
+            'fastest': int(times.min()),
+            'slowest': int(times.max()),
+            'total_time': int(times.sum())
         }
     
-    def _identify_strengths(self, answers: List[Answer], overall_accuracy: float) -> List[str]:
+    def _identify_strengths(self, type_stats: Dict, overall_accuracy: float, times: np.ndarray) -> List[str]:
         """Identify user's strengths"""
         strengths = []
         
@@ -93,29 +116,18 @@ class ScoringEngine:
             strengths.append("Good listening comprehension")
         
         # Analyze timing
-        times = [a.time_taken for a in answers if a.time_taken]
-        if times:
-            avg_time = sum(times) / len(times)
+        if times.size:
+            avg_time = times.mean()
             if avg_time < 30:  # Less than 30 seconds per question
                 strengths.append("Quick response time")
         
         # Analyze question types
-        correct_types = []
-        for answer in answers:
-            if answer.is_correct:
-                question = Question.query.get(answer.question_id)
-                correct_types.append(question.question_type)
-        
-        type_counts = {}
-        for q_type in correct_types:
-            type_counts[q_type] = type_counts.get(q_type, 0) + 1
-        
-        if type_counts.get('multiple_choice', 0) >= 3:
+        if type_stats.get('multiple_choice', {}).get('correct', 0) >= 3:
             strengths.append("Strong performance on multiple choice questions")
         
         return strengths if strengths else ["Completed the practice session"]
     
-    def _identify_weaknesses(self, answers: List[Answer], overall_accuracy: float) -> List[str]:
+    def _identify_weaknesses(self, correct: np.ndarray, overall_accuracy: float, times: np.ndarray) -> List[str]:
         """Identify areas for improvement"""
         weaknesses = []
         
@@ -125,14 +137,13 @@ class ScoringEngine:
             weaknesses.append("Moderate listening comprehension - room for improvement")
         
         # Analyze incorrect answers
-        incorrect_answers = [a for a in answers if not a.is_correct]
-        if len(incorrect_answers) > len(answers) * 0.5:  # More than 50% incorrect
+        incorrect_count = correct.size - int(correct.sum())
+        if incorrect_count > correct.size * 0.5:  # More than 50% incorrect
             weaknesses.append("Difficulty with main idea questions")
         
         # Analyze timing issues
-        times = [a.time_taken for a in answers if a.time_taken]
-        if times:
-            avg_time = sum(times) / len(times)
+        if times.size:
+            avg_time = times.mean()
             if avg_time > 90:  # More than 90 seconds per question
                 weaknesses.append("Taking too much time per question")
         
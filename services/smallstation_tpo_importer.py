@@ -4,141 +4,140 @@
 每個TPO包含6題，分為2個部分：
 - 第一部分：師生討論(passage1_1) + 學術講座1(passage1_2) + 學術講座2(passage1_3)
 - 第二部分：師生討論(passage2_1) + 學術講座1(passage2_2) + 學術講座2(passage2_3)
+
+批量寫入見 services.tpo_bulk
 """
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import itertools
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import SQLAlchemyError
+
 from app import app, db
-from models import ContentSource, Question
-from datetime import datetime
+from models import ContentSource, Question, TPO_CONTENT_TYPES
+from services.tpo_bulk import bulk_insert_content, iter_tpo_rows
+from services.tpo_urls import audio_url
+
+# 話題列表，依 (tpo_num + section + part) 輪替
+TOPICS = (
+    "課程選擇", "作業討論", "考試安排", "研究計畫", "圖書館服務",
+    "生物學", "歷史學", "心理學", "天文學", "地質學", "文學",
+    "藝術史", "經濟學", "社會學", "環境科學", "物理學", "化學"
+)
+
+# 各題型: (題目類型, 類別, 描述模板, 時長秒數)，part 1 為師生討論，其餘為學術講座
+CONVERSATION_PART = ("師生討論", "Campus Conversation", "關於{topic}的師生對話", 240)  # 4分鐘
+LECTURE_PART = ("學術講座", "Academic Lecture", "關於{topic}的學術講座", 300)  # 5分鐘
+
+# 每個TPO有2個部分，每個部分3題；題型在匯入時就配好: (section, part, 題目類型, 類別, 描述模板, 時長秒數)
+SECTIONS = tuple(
+    (section, part) + (CONVERSATION_PART if part == 1 else LECTURE_PART)
+    for section, part in itertools.product((1, 2), (1, 2, 3))
+)
 
 def generate_smallstation_tpo_data():
-    """生成小站TPO數據，使用正確的音檔URL格式"""
-    
-    tpo_data = []
-    
-    # TPO 1-75的完整數據
-    for tpo_num in range(1, 76):
-        # 每個TPO有2個部分，每個部分3題
-        for section in [1, 2]:  # 第一部分和第二部分
-            for part in [1, 2, 3]:  # 每部分3題
-                
-                # 確定題目類型
-                if part == 1:
-                    topic_type = "師生討論"
-                    topic_category = "Campus Conversation"
-                    description_template = "關於{topic}的師生對話"
-                else:
-                    topic_type = "學術講座"
-                    topic_category = "Academic Lecture"
-                    description_template = "關於{topic}的學術講座"
-                
-                # 生成話題
-                topics = [
-                    "課程選擇", "作業討論", "考試安排", "研究計畫", "圖書館服務",
-                    "生物學", "歷史學", "心理學", "天文學", "地質學", "文學",
-                    "藝術史", "經濟學", "社會學", "環境科學", "物理學", "化學"
-                ]
-                topic = topics[(tpo_num + section + part) % len(topics)]
-                
-                # 正確的音檔URL格式
-                audio_url = f"https://tikustorage-sh.oss-cn-shanghai.aliyuncs.com/TPO_Audio/tpo{tpo_num}/tpo{tpo_num}_listening_passage{section}_{part}.mp3"
-                
-                content_item = {
-                    'name': f"小站TPO {tpo_num} Section{section}-{part}",
-                    'type': 'smallstation_tpo',
-                    'url': audio_url,
-                    'description': description_template.format(topic=topic),
-                    'topic': topic,
-                    'difficulty_level': 'intermediate',
-                    'duration': 240 if part == 1 else 300,  # 師生討論4分鐘，學術講座5分鐘
-                    'content_metadata': {
-                        'tpo_number': tpo_num,
-                        'section': section,
-                        'part': part,
-                        'content_type': topic_type,
-                        'category': topic_category
-                    }
-                }
-                
-                tpo_data.append(content_item)
+    """逐筆產生小站TPO 1-75數據，使用正確的音檔URL格式"""
+    return iter_tpo_rows(1, 75, SECTIONS, _smallstation_row)
+
+def _smallstation_row(tpo_num, section_info):
+    section, part, topic_type, topic_category, description_template, duration = section_info
+    topic = TOPICS[(tpo_num + section + part) % len(TOPICS)]
     
-    return tpo_data
+    return {
+        'name': f"小站TPO {tpo_num} Section{section}-{part}",
+        'type': 'smallstation_tpo',
+        # 正確的音檔URL格式
+        'url': audio_url(tpo_num, section, part),
+        'description': description_template.format(topic=topic),
+        'topic': topic,
+        'difficulty_level': 'intermediate',
+        'duration': duration,
+        'content_metadata': {
+            'tpo_number': tpo_num,
+            'section': section,
+            'part': part,
+            'content_type': topic_type,
+            'category': topic_category
+        }
+    }
 
 def clear_old_tpo_data():
     """清理舊的TPO數據"""
     try:
-        # 刪除舊的TPO ContentSource
-        old_tpo_content = ContentSource.query.filter_by(type='tpo').all()
-        old_smallstation_content = ContentSource.query.filter_by(type='smallstation_tpo').all()
+        # 只需要數量，一次 GROUP BY 計數，不載入整批資料
+        old_counts = dict(db.session.execute(
+            select(ContentSource.type, func.count())
+            .where(ContentSource.type.in_(TPO_CONTENT_TYPES))
+            .group_by(ContentSource.type)
+        ).all())
         
-        print(f"🗑️ 找到 {len(old_tpo_content)} 個舊TPO內容")
-        print(f"🗑️ 找到 {len(old_smallstation_content)} 個舊小站TPO內容")
+        print(f"🗑️ 找到 {old_counts.get('tpo', 0)} 個舊TPO內容")
+        print(f"🗑️ 找到 {old_counts.get('smallstation_tpo', 0)} 個舊小站TPO內容")
         
-        for content in old_tpo_content + old_smallstation_content:
-            # 刪除相關的Question
-            questions = Question.query.filter_by(content_id=content.id).all()
-            for question in questions:
-                db.session.delete(question)
-            
-            # 刪除ContentSource
-            db.session.delete(content)
+        # 先刪除相關的Question，再刪除ContentSource，各一條 DELETE
+        tpo_ids = select(ContentSource.id).where(ContentSource.type.in_(TPO_CONTENT_TYPES))
+        db.session.execute(
+            delete(Question).where(Question.content_id.in_(tpo_ids)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.execute(
+            delete(ContentSource).where(ContentSource.type.in_(TPO_CONTENT_TYPES)),
+            execution_options={'synchronize_session': False}
+        )
         
         db.session.commit()
         print(f"✅ 已清理所有舊的TPO數據")
         
-    except Exception as e:
+    except SQLAlchemyError as e:
         db.session.rollback()
         print(f"❌ 清理失敗: {e}")
         raise
 
-def import_smallstation_tpo():
-    """導入小站TPO數據"""
+def clear_colliding_tpo_data(urls):
+    """
+    在目前的交易中刪除音檔URL與小站TPO相同的舊 'tpo' 內容及其題目，回傳刪除的內容數
+    這些內容和小站TPO共用 unique_content_url，不先刪除的話小站TPO會寫入失敗
+    """
+    colliding = (ContentSource.type == 'tpo', ContentSource.url.in_(urls))
+    db.session.execute(
+        delete(Question).where(Question.content_id.in_(select(ContentSource.id).where(*colliding))),
+        execution_options={'synchronize_session': False}
+    )
+    return db.session.execute(
+        delete(ContentSource).where(*colliding),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+
+def import_smallstation_tpo(reset=False):
+    """
+    導入小站TPO數據
+    已存在的內容會直接跳過，可重複執行；音檔URL相同的舊 'tpo' 內容會先被取代
+    reset=True 時先清空所有舊TPO數據再完整重建
+    """
     
     print("🚀 開始導入小站TPO數據...")
     
-    # 清理舊數據
-    clear_old_tpo_data()
-    
-    # 生成新數據
-    tpo_data = generate_smallstation_tpo_data()
-    print(f"📝 生成了 {len(tpo_data)} 個小站TPO內容項目")
-    
-    # 導入到數據庫
-    success_count = 0
-    for item in tpo_data:
-        try:
-            content = ContentSource(
-                name=item['name'],
-                type=item['type'],
-                url=item['url'],
-                description=item['description'],
-                topic=item['topic'],
-                difficulty_level=item['difficulty_level'],
-                duration=item['duration'],
-                content_metadata=item['content_metadata'],
-                created_at=datetime.utcnow()
-            )
-            
-            db.session.add(content)
-            success_count += 1
-            
-            # 每100個提交一次
-            if success_count % 100 == 0:
-                db.session.commit()
-                print(f"  已導入 {success_count}/{len(tpo_data)} 項...")
-                
-        except Exception as e:
-            print(f"❌ 導入失敗 {item['name']}: {e}")
-            db.session.rollback()
-            continue
+    if reset:
+        clear_old_tpo_data()
     
-    # 最終提交
-    db.session.commit()
+    # 邊產生邊分批寫入，不先組出完整列表；整個導入只用一個交易
+    # 產生的資料是確定的，不逐列攔截例外；只有資料庫本身出錯時才中止整個導入
+    try:
+        replaced_count = clear_colliding_tpo_data([row['url'] for row in generate_smallstation_tpo_data()])
+        if replaced_count:
+            print(f"🗑️ 已移除 {replaced_count} 個音檔URL相同的舊TPO內容")
+        success_count = bulk_insert_content(generate_smallstation_tpo_data())
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        print(f"❌ 導入失敗: {e}")
+        raise
     
-    print(f"✅ 導入完成！成功導入 {success_count} 個小站TPO內容")
+    print(f"✅ 導入完成！新導入 {success_count} 個小站TPO內容")
     
     # 驗證導入結果
     total_count = ContentSource.query.filter_by(type='smallstation_tpo').count()
@@ -152,4 +151,4 @@ def import_smallstation_tpo():
 
 if __name__ == "__main__":
     with app.app_context():
-        import_smallstation_tpo()
\ No newline at end of file
+        import_smallstation_tpo(reset='--reset' in sys.argv)
\ No newline at end of file
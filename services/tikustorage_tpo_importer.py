@@ -3,24 +3,48 @@
 根據用戶指定的音檔格式重新導入所有TPO內容
 """
 
+import asyncio
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from app import app, db
 from models import ContentSource, Question
+from services.tpo_bulk import insert_content_ids
+from services.tpo_urls import audio_url
 import trafilatura
-import time
 import json
 
+# 題目開頭（"1."）與選項開頭（"A."）
+_QUESTION_RE = re.compile(r'^\d+\.')
+_OPTION_RE = re.compile(r'^[A-D]\.')
+
 class TikustorageTPOImporter:
+    # 同時抓取的題目頁面數
+    FETCH_CONCURRENCY = 16
+    FETCH_TIMEOUT = 15
+    
     def __init__(self):
         self.base_url = "https://top.zhan.com/toefl/listen/"
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            # 只宣告 requests 與 aiohttp 都能原生解壓的編碼
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
         })
+        # 重複使用到 zhan.com 的連線，遇到限流或暫時性錯誤才退避重試
+        adapter = HTTPAdapter(
+            pool_connections=32, pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
-        # TPO音檔格式：支援tikustorage和koocdn两种格式
-        self.audio_base_url = "https://tikustorage-sh.oss-cn-shanghai.aliyuncs.com/TPO_Audio"
+        # TPO音檔格式：支援tikustorage和koocdn两种格式（tikustorage格式見 services.tpo_urls）
         self.koocdn_base_url = "https://ti.koocdn.com/upload/ti"
         
         # 小站TPO映射（保持原有內容結構，但使用新音檔格式）
@@ -90,13 +114,6 @@ class TikustorageTPOImporter:
             }
         }
     
-    def generate_tikustorage_audio_url(self, tpo_num, passage, part):
-        """
-        生成tikustorage格式的音檔URL
-        格式：https://tikustorage-sh.oss-cn-shanghai.aliyuncs.com/TPO_Audio/tpo{N}/tpo{N}_listening_passage{X}_{Y}.mp3
-        """
-        return f"{self.audio_base_url}/tpo{tpo_num}/tpo{tpo_num}_listening_passage{passage}_{part}.mp3"
-    
     def get_audio_url(self, tpo_num, section_data):
         """
         獲取音檔URL - 支援預定義URL或生成tikustorage格式
@@ -106,143 +123,182 @@ class TikustorageTPOImporter:
             return section_data['url']
         else:
             # 生成tikustorage格式URL
-            return self.generate_tikustorage_audio_url(tpo_num, section_data['passage'], section_data['part'])
+            return audio_url(tpo_num, section_data['passage'], section_data['part'])
     
     def get_questions_from_zhan(self, article_id):
         """從zhan.com獲取題目內容"""
         try:
             # 獲取題目頁面
-            questions_url = f"https://top.zhan.com/toefl/listen/detail.html?article_id={article_id}"
-            response = self.session.get(questions_url, timeout=15)
+            questions_url = self._questions_url(article_id)
+            response = self.session.get(questions_url, timeout=self.FETCH_TIMEOUT)
             
             if response.status_code != 200:
                 print(f"❌ 無法訪問題目頁面: {questions_url}")
                 return []
             
-            # 使用trafilatura提取內容
-            extracted_text = trafilatura.extract(response.text)
-            if not extracted_text:
-                print(f"❌ 無法提取題目內容")
-                return []
-            
-            # 解析題目（簡化版本，後續可擴展）
-            questions = []
-            lines = extracted_text.split('\n')
-            
-            current_question = None
-            current_options = []
+            return self._parse_questions(response.text)
             
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # 檢測題目開始（數字或問號）
-                if re.match(r'^\d+\.', line) or '?' in line:
-                    if current_question:
-                        # 保存前一個題目
-                        questions.append({
-                            'question': current_question,
-                            'options': current_options.copy(),
-                            'correct_answer': 'A'  # 預設，需要進一步解析
-                        })
-                    
-                    current_question = line
-                    current_options = []
-                
-                # 檢測選項（A、B、C、D）
-                elif re.match(r'^[A-D]\.', line):
-                    current_options.append(line)
-            
-            # 處理最後一個題目
-            if current_question:
-                questions.append({
-                    'question': current_question,
-                    'options': current_options,
-                    'correct_answer': 'A'
-                })
+        except Exception as e:
+            print(f"❌ 獲取題目失敗 (article_id: {article_id}): {e}")
+            return []
+    
+    def _questions_url(self, article_id):
+        return f"https://top.zhan.com/toefl/listen/detail.html?article_id={article_id}"
+    
+    def fetch_all_questions(self, article_ids):
+        """並發抓取多篇題目頁面，回傳 {article_id: 題目列表}"""
+        return asyncio.run(self._afetch_all_questions(list(article_ids)))
+    
+    async def _afetch_all_questions(self, article_ids):
+        """共用單一ClientSession並以Semaphore限制並發數"""
+        sem = asyncio.Semaphore(self.FETCH_CONCURRENCY)
+        connector = aiohttp.TCPConnector(limit=self.FETCH_CONCURRENCY, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.FETCH_TIMEOUT)
+        
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers=dict(self.session.headers)) as session:
+            results = await asyncio.gather(
+                *[self._afetch_questions(session, article_id, sem) for article_id in article_ids]
+            )
+        
+        return dict(zip(article_ids, results))
+    
+    async def _afetch_questions(self, session, article_id, sem):
+        """抓取單一題目頁面並在執行緒池中解析"""
+        questions_url = self._questions_url(article_id)
+        try:
+            async with sem:
+                async with session.get(questions_url) as response:
+                    if response.status != 200:
+                        print(f"❌ 無法訪問題目頁面: {questions_url}")
+                        return []
+                    html = await response.text()
             
-            return questions
+            # trafilatura 是同步的CPU工作，不佔用事件迴圈
+            return await asyncio.get_running_loop().run_in_executor(None, self._parse_questions, html)
             
         except Exception as e:
             print(f"❌ 獲取題目失敗 (article_id: {article_id}): {e}")
             return []
     
+    def _parse_questions(self, html):
+        """從題目頁面HTML解析題目"""
+        # 使用trafilatura提取內容
+        extracted_text = trafilatura.extract(html)
+        if not extracted_text:
+            print(f"❌ 無法提取題目內容")
+            return []
+        
+        return list(self._iter_questions(extracted_text))
+    
+    def _iter_questions(self, extracted_text):
+        """逐題產生解析結果（簡化版本，後續可擴展）"""
+        current_question = None
+        current_options = []
+        
+        for line in map(str.strip, extracted_text.splitlines()):
+            if not line:
+                continue
+            
+            # 檢測題目開始（數字或問號）
+            if '?' in line or _QUESTION_RE.match(line):
+                if current_question:
+                    # 產生前一個題目
+                    yield {
+                        'question': current_question,
+                        'options': current_options,
+                        'correct_answer': 'A'  # 預設，需要進一步解析
+                    }
+                
+                current_question = line
+                current_options = []
+            
+            # 檢測選項（A、B、C、D）
+            elif _OPTION_RE.match(line):
+                current_options.append(line)
+        
+        # 處理最後一個題目
+        if current_question:
+            yield {
+                'question': current_question,
+                'options': current_options,
+                'correct_answer': 'A'
+            }
+    
     def import_tpo_range(self, start_tpo=1, end_tpo=75):
         """導入指定範圍的TPO數據"""
         print(f"🚀 開始導入TPO {start_tpo}-{end_tpo}...")
         
         total_imported = 0
+        total_questions = 0
+        missing_tpos = []
+        failures = []
+        
+        # 先並發抓取範圍內所有題目頁面，資料庫寫入仍在主執行緒依序進行
+        tpo_nums = [tpo_num for tpo_num in range(start_tpo, end_tpo + 1) if tpo_num in self.tpo_mapping]
+        questions_by_article = self.fetch_all_questions(
+            section_data['article_id']
+            for tpo_num in tpo_nums
+            for section_data in self.tpo_mapping[tpo_num].values()
+        )
         
         with app.app_context():
             for tpo_num in range(start_tpo, end_tpo + 1):
                 if tpo_num not in self.tpo_mapping:
-                    print(f"⚠️ TPO {tpo_num} 映射數據不存在，跳過")
+                    missing_tpos.append(tpo_num)
                     continue
                 
-                print(f"\n📚 處理 TPO {tpo_num}...")
                 tpo_data = self.tpo_mapping[tpo_num]
                 
+                # 整個TPO的內容一次寫入，用 RETURNING 依名稱取回ID，不必逐筆 flush
+                content_rows = []
                 for section_name, section_data in tpo_data.items():
-                    try:
-                        article_id = section_data['article_id']
-                        title = section_data['title']
-                        topic = section_data['topic']
-                        passage = section_data['passage']
-                        part = section_data['part']
-                        
+                    content_rows.append({
+                        'name': f"Simulate {tpo_num} {section_name}",
                         # 獲取音檔URL（支援多種格式）
-                        audio_url = self.get_audio_url(tpo_num, section_data)
-                        
-                        # 創建ContentSource
-                        content_name = f"Simulate {tpo_num} {section_name}"
-                        content = ContentSource(
-                            name=content_name,
-                            url=audio_url,
-                            type='tpo',
-                            description=f"TPO {tpo_num} {section_name}: {title} (小站TPO - tikustorage音檔)",
-                            topic=topic,
-                            duration=300  # 預設5分鐘，後續可調整
-                        )
-                        
-                        db.session.add(content)
-                        db.session.flush()  # 獲取ID
-                        
-                        print(f"✅ 創建 {content_name} (ID: {content.id})")
-                        print(f"   音檔: {audio_url}")
-                        
-                        # 獲取並創建題目
-                        questions = self.get_questions_from_zhan(article_id)
-                        
-                        for i, q_data in enumerate(questions):
-                            question = Question(
-                                content_id=content.id,
-                                question_text=q_data['question'],
-                                options=json.dumps(q_data['options'], ensure_ascii=False),
-                                correct_answer=q_data['correct_answer'],
-                                question_type='multiple_choice',
-                                order_num=i + 1
-                            )
-                            db.session.add(question)
-                        
-                        print(f"   題目數量: {len(questions)}")
-                        total_imported += 1
-                        
-                        # 每5個內容提交一次
-                        if total_imported % 5 == 0:
-                            db.session.commit()
-                            print(f"💾 已提交 {total_imported} 個內容...")
-                            time.sleep(1)  # 避免過載
-                        
-                    except Exception as e:
-                        print(f"❌ 處理 TPO {tpo_num} {section_name} 失敗: {e}")
-                        db.session.rollback()
-                        continue
-            
-            # 最終提交
-            db.session.commit()
+                        'url': self.get_audio_url(tpo_num, section_data),
+                        'type': 'tpo',
+                        'description': f"TPO {tpo_num} {section_name}: {section_data['title']} (小站TPO - tikustorage音檔)",
+                        'topic': section_data['topic'],
+                        'duration': 300  # 預設5分鐘，後續可調整
+                    })
+                
+                try:
+                    # 衝突的section只跳過自己，同一TPO的其他內容和題目照常寫入
+                    content_ids, section_failures = insert_content_ids(content_rows)
+                    failures.extend(section_failures)
+                    
+                    # 題目依內容順序一起批量寫入，已存在的內容不重複加題
+                    question_rows = []
+                    for content_row, section_data in zip(content_rows, tpo_data.values()):
+                        content_id = content_ids.get(content_row['name'])
+                        if content_id is None:
+                            continue
+                        question_rows.extend({
+                            'content_id': content_id,
+                            'question_text': q_data['question'],
+                            'options': json.dumps(q_data['options'], ensure_ascii=False),
+                            'correct_answer': q_data['correct_answer'],
+                            'question_type': 'multiple_choice'
+                        } for q_data in questions_by_article[section_data['article_id']])
+                    
+                    if question_rows:
+                        db.session.execute(insert(Question), question_rows)
+                    
+                    db.session.commit()
+                    total_imported += len(content_ids)
+                    total_questions += len(question_rows)
+                    
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    failures.append((f"TPO {tpo_num}", getattr(e, 'orig', None) or e))
             
-        print(f"\n🎉 導入完成！總共導入 {total_imported} 個TPO內容")
+        if missing_tpos:
+            print(f"⚠️ {len(missing_tpos)} 個TPO映射數據不存在，已跳過: {missing_tpos}")
+        if failures:
+            failed_names = [name for name, _ in failures]
+            print(f"❌ {len(failures)} 個內容導入失敗（{'、'.join(failed_names[:5])} 等）: {failures[-1][1]}")
+        print(f"\n🎉 導入完成！總共導入 {total_imported} 個TPO內容、{total_questions} 道題目")
         return total_imported
     
     def import_koocdn_tpo_range(self, start_tpo=35, end_tpo=36):
@@ -270,6 +326,8 @@ class TikustorageTPOImporter:
         }
         
         total_imported = 0
+        existing_count = 0
+        failed_count = 0
         
         with app.app_context():
             for tpo_num in range(start_tpo, end_tpo + 1):
@@ -277,64 +335,68 @@ class TikustorageTPOImporter:
                     print(f"⚠️ TPO {tpo_num} koocdn URL不存在，跳過")
                     continue
                 
-                print(f"\n📚 處理 TPO {tpo_num}...")
                 tpo_urls = koocdn_tpo_urls[tpo_num]
                 
                 # 處理每個section (1-2) 和 part (1-3)
                 for section in [1, 2]:
                     for part in ['1', '2', '3']:
                         if section in tpo_urls and part in tpo_urls[section]:
+                            audio_url = tpo_urls[section][part]
+                            
+                            # 確定內容類型
+                            if part == '1':
+                                content_type = '校園對話'
+                                topic = '校園對話'
+                            else:
+                                content_type = '學術講座'
+                                topic = '學術講座'
+                            
+                            # 創建ContentSource
+                            content_name = f"TPO {tpo_num} Section {section} Passage {part}"
+                            
+                            # 檢查是否已存在
+                            existing = ContentSource.query.filter_by(
+                                name=content_name, 
+                                type='smallstation_tpo'
+                            ).first()
+                            
+                            if existing:
+                                existing_count += 1
+                                continue
+                            
+                            content = ContentSource(
+                                name=content_name,
+                                url=audio_url,
+                                type='smallstation_tpo',
+                                description=f"TPO {tpo_num} Section {section} Passage {part}: {content_type} (koocdn音檔)",
+                                topic=topic,
+                                difficulty_level='中',
+                                duration=180,  # 預設3分鐘
+                                language='英語'
+                            )
+                            
+                            # 每筆放在自己的 SAVEPOINT 內，衝突只回滾這一筆，同一TPO的其他內容照常提交
                             try:
-                                audio_url = tpo_urls[section][part]
-                                
-                                # 確定內容類型
-                                if part == '1':
-                                    content_type = '校園對話'
-                                    topic = '校園對話'
-                                else:
-                                    content_type = '學術講座'
-                                    topic = '學術講座'
-                                
-                                # 創建ContentSource
-                                content_name = f"TPO {tpo_num} Section {section} Passage {part}"
-                                
-                                # 檢查是否已存在
-                                existing = ContentSource.query.filter_by(
-                                    name=content_name, 
-                                    type='smallstation_tpo'
-                                ).first()
-                                
-                                if existing:
-                                    print(f"⚠️ {content_name} 已存在，跳過")
-                                    continue
-                                
-                                content = ContentSource(
-                                    name=content_name,
-                                    url=audio_url,
-                                    type='smallstation_tpo',
-                                    description=f"TPO {tpo_num} Section {section} Passage {part}: {content_type} (koocdn音檔)",
-                                    topic=topic,
-                                    difficulty_level='中',
-                                    duration=180,  # 預設3分鐘
-                                    language='英語'
-                                )
-                                
-                                db.session.add(content)
-                                total_imported += 1
-                                print(f"✅ 添加: {content_name}")
-                                
-                            except Exception as e:
-                                print(f"❌ 處理 TPO {tpo_num} S{section}P{part} 失敗: {e}")
+                                with db.session.begin_nested():
+                                    db.session.add(content)
+                            except IntegrityError as e:
+                                failed_count += 1
+                                last_error = e.orig
                                 continue
+                            
+                            total_imported += 1
                 
                 # 每個TPO處理完後提交
                 try:
                     db.session.commit()
-                    print(f"✅ TPO {tpo_num} 導入完成")
                 except Exception as e:
                     db.session.rollback()
                     print(f"❌ TPO {tpo_num} 提交失敗: {e}")
         
+        if existing_count:
+            print(f"⚠️ {existing_count} 個項目已存在，已跳過")
+        if failed_count:
+            print(f"❌ {failed_count} 個項目導入失敗: {last_error}")
         print(f"\n🎉 koocdn TPO導入完成！共導入 {total_imported} 個項目")
         return f"✅ 成功導入 {total_imported} 個koocdn TPO項目"
 
@@ -0,0 +1,124 @@
+"""
+TPO批量導入共用核心 - 逐筆產生ContentSource資料列並以Core INSERT分批寫入
+
+批量寫入依賴 app.py 引擎設定的 executemany_mode="values_plus_batch"，
+在PostgreSQL上才會合併成多列 INSERT。
+已存在的內容（同名稱+類型）以 ON CONFLICT DO NOTHING 跳過，重複執行導入不會重寫資料；
+其他衝突（例如URL重複）照常報錯並計入失敗。
+ON CONFLICT 需要 unique_tpo_content_name_type 索引；舊資料庫若因重複資料建不起索引，改用一般 INSERT。
+"""
+
+import functools
+import itertools
+
+from sqlalchemy import inspect, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import ContentSource, TPO_CONTENT_WHERE
+
+# 每批寫入的列數
+INSERT_BATCH_SIZE = 1000
+
+# ON CONFLICT (name, type) 對應的部分唯一索引
+TPO_NAME_INDEX = 'unique_tpo_content_name_type'
+
+
+def iter_tpo_rows(start_tpo, end_tpo, sections, make_row):
+    """
+    逐筆產生 TPO start_tpo-end_tpo 每個section的資料列
+    make_row(tpo_num, section) 決定各導入器的名稱、描述等內容
+    """
+    for tpo_num, section in itertools.product(range(start_tpo, end_tpo + 1), sections):
+        yield make_row(tpo_num, section)
+
+
+@functools.lru_cache(maxsize=None)
+def _has_tpo_name_index(engine):
+    """資料庫中是否已有 TPO_NAME_INDEX；每個引擎只檢查一次"""
+    indexes = {index['name'] for index in inspect(engine).get_indexes(ContentSource.__tablename__)}
+    if TPO_NAME_INDEX not in indexes:
+        print(f"⚠️ 缺少 {TPO_NAME_INDEX} 索引，改用一般 INSERT，重複執行導入時已存在的內容會計入失敗")
+        return False
+    return True
+
+
+def _content_insert():
+    """ContentSource的INSERT，跳過同名稱+類型已存在的TPO內容，RETURNING 只回傳真正寫入的列的 (ID, 名稱)"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(ContentSource)
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(ContentSource)
+    else:
+        stmt = insert(ContentSource)
+    if dialect in ('postgresql', 'sqlite') and _has_tpo_name_index(db.engine):
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=['name', 'type'],
+            index_where=TPO_CONTENT_WHERE
+        )
+    return stmt.returning(ContentSource.id, ContentSource.name)
+
+
+def _insert_one_by_one(stmt, rows):
+    """逐筆各自放在 SAVEPOINT 內寫入，回傳 ({名稱: ID}, [(名稱, 錯誤)])"""
+    content_ids = {}
+    failures = []
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                content_ids.update((name, content_id) for content_id, name in db.session.execute(stmt, row))
+        except IntegrityError as e:
+            failures.append((row['name'], e.orig))
+    return content_ids, failures
+
+
+def insert_content_ids(rows):
+    """
+    在目前的交易中寫入一組ContentSource資料列，回傳 ({名稱: ID}, [(名稱, 錯誤)])
+    已存在的內容不在回傳的ID中；整組失敗時逐筆重試，只跳過真正衝突的那幾筆
+    """
+    stmt = _content_insert()
+    try:
+        with db.session.begin_nested():
+            return {name: content_id for content_id, name in db.session.execute(stmt, rows)}, []
+    except IntegrityError:
+        return _insert_one_by_one(stmt, rows)
+
+
+def bulk_insert_content(rows, batch_size=INSERT_BATCH_SIZE):
+    """
+    在目前的交易中分批寫入ContentSource資料列，回傳實際寫入的筆數
+    每批放在 SAVEPOINT 內；仍然失敗的批次之後逐筆重試，只跳過真正衝突的那幾筆
+    進度不逐批輸出，只在有失敗時彙總印出一行
+    """
+    stmt = _content_insert()
+    success_count = 0
+    failed_rows = []
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+
+        try:
+            with db.session.begin_nested():
+                result = db.session.execute(
+                    stmt, batch,
+                    execution_options={'insertmanyvalues_page_size': 1000}
+                )
+                # 以 RETURNING 的列數為準，衝突跳過的列不計入
+                inserted = len(result.all())
+            success_count += inserted
+        except IntegrityError:
+            failed_rows.extend(batch)
+
+    content_ids, failures = _insert_one_by_one(stmt, failed_rows)
+    success_count += len(content_ids)
+
+    if failures:
+        failed_names = [name for name, _ in failures]
+        print(f"❌ {len(failures)} 個內容導入失敗（{'、'.join(failed_names[:5])} 等）: {failures[-1][1]}")
+
+    return success_count
@@ -0,0 +1,14 @@
+"""
+TPO音檔URL - 各TPO導入器共用的tikustorage音檔格式
+格式：https://tikustorage-sh.oss-cn-shanghai.aliyuncs.com/TPO_Audio/tpo{N}/tpo{N}_listening_passage{X}_{Y}.mp3
+"""
+
+TIKUSTORAGE_AUDIO_BASE_URL = "https://tikustorage-sh.oss-cn-shanghai.aliyuncs.com/TPO_Audio"
+
+# 模板在匯入時就組好，每次只需填入編號
+_AUDIO_URL_TEMPLATE = TIKUSTORAGE_AUDIO_BASE_URL + "/tpo{tpo}/tpo{tpo}_listening_passage{passage}_{part}.mp3"
+
+
+def audio_url(tpo_num, passage, part):
+    """生成tikustorage格式的音檔URL"""
+    return _AUDIO_URL_TEMPLATE.format_map({'tpo': tpo_num, 'passage': passage, 'part': part})
@@ -4,20 +4,28 @@
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import re
+from concurrent.futures import ThreadPoolExecutor
 from app import app, db
 from models import ContentSource, Question
 import trafilatura
-import time
 import json
 
 class ZhanCompleteImporter:
+    # 同時抓取練習頁面的執行緒數
+    FETCH_WORKERS = 16
+    
     def __init__(self):
         self.base_url = "https://top.zhan.com/toefl/listen/"
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        # 連線池要容得下所有抓取執行緒
+        adapter = HTTPAdapter(pool_maxsize=self.FETCH_WORKERS)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
         # zhan.com 的真實TPO映射（基於抓取的數據）
         self.tpo_mapping = {
@@ -99,6 +107,12 @@ class ZhanCompleteImporter:
             print(f"❌ 獲取音頻URL失敗 (article_id: {article_id}): {e}")
             return f"https://top-static.zhan.com/toefl/audio/article_{article_id}.mp3"
     
+    def prefetch_audio_urls(self, article_ids):
+        """以執行緒池並發抓取多篇文章的音頻URL，回傳 {article_id: URL}"""
+        article_ids = list(dict.fromkeys(article_ids))
+        with ThreadPoolExecutor(max_workers=self.FETCH_WORKERS) as executor:
+            return dict(zip(article_ids, executor.map(self.get_audio_url_from_zhan, article_ids)))
+    
     def fix_practice_776(self):
         """修復 Practice 776 - 找到正確的TPO 24內容"""
         print("🔧 修復 Practice 776...")
@@ -139,10 +153,13 @@ class ZhanCompleteImporter:
         imported_count = 0
         updated_count = 0
         
+        # 先並發抓取所有音頻URL，資料庫寫入仍在主執行緒依序進行
+        audio_urls = self.prefetch_audio_urls(
+            part_data['article_id'] for tpo_parts in self.tpo_mapping.values() for part_data in tpo_parts.values()
+        )
+        
         with app.app_context():
             for tpo_num, tpo_parts in self.tpo_mapping.items():
-                print(f"\\n📚 處理 TPO {tpo_num}...")
-                
                 for part_name, part_data in tpo_parts.items():
                     name = f"Official {tpo_num} {part_name}"
                     
@@ -150,7 +167,7 @@ class ZhanCompleteImporter:
                     existing = ContentSource.query.filter_by(name=name, type='tpo').first()
                     
                     # 獲取真實音頻URL
-                    audio_url = self.get_audio_url_from_zhan(part_data['article_id'])
+                    audio_url = audio_urls[part_data['article_id']]
                     
                     if existing:
                         # 更新現有內容
@@ -158,7 +175,6 @@ class ZhanCompleteImporter:
                         existing.description = f"TPO {tpo_num} {part_data['title']} (zhan.com Official)"
                         existing.topic = part_data['topic']
                         updated_count += 1
-                        print(f"🔄 更新: {name}")
                     else:
                         # 創建新內容
                         content = ContentSource(
@@ -172,12 +188,10 @@ class ZhanCompleteImporter:
                         )
                         db.session.add(content)
                         imported_count += 1
-                        print(f"✅ 新增: {name}")
                     
                     # 每5個提交一次避免超時
                     if (imported_count + updated_count) % 5 == 0:
                         db.session.commit()
-                        time.sleep(0.2)  # 避免過快請求
             
             # 最終提交
             db.session.commit()
@@ -195,6 +209,8 @@ class ZhanCompleteImporter:
             # 獲取所有現有的TPO內容
             existing_tpos = ContentSource.query.filter_by(type='tpo').all()
             
+            # 找出在映射中的內容，再一次並發抓取它們的音頻URL
+            matched = []
             for content in existing_tpos:
                 # 解析TPO編號和部分
                 match = re.search(r'Official (\\d+) (Con\\d|Lec\\d+)', content.name)
@@ -206,23 +222,21 @@ class ZhanCompleteImporter:
                 
                 # 檢查是否在我們的映射中
                 if tpo_num in self.tpo_mapping and part in self.tpo_mapping[tpo_num]:
-                    part_data = self.tpo_mapping[tpo_num][part]
-                    
-                    # 更新音頻URL和描述
-                    new_audio_url = self.get_audio_url_from_zhan(part_data['article_id'])
-                    content.url = new_audio_url
-                    content.description = f"TPO {tpo_num} {part_data['title']} (zhan.com Official)"
-                    content.topic = part_data['topic']
-                    
-                    updated_count += 1
-                    
-                    if updated_count <= 10:  # 顯示前10個更新
-                        print(f"✅ 更新: {content.name} -> article_id: {part_data['article_id']}")
+                    matched.append((content, tpo_num, self.tpo_mapping[tpo_num][part]))
+            
+            audio_urls = self.prefetch_audio_urls(part_data['article_id'] for _, _, part_data in matched)
+            
+            for content, tpo_num, part_data in matched:
+                # 更新音頻URL和描述
+                content.url = audio_urls[part_data['article_id']]
+                content.description = f"TPO {tpo_num} {part_data['title']} (zhan.com Official)"
+                content.topic = part_data['topic']
+                
+                updated_count += 1
                 
                 # 每10個提交一次
                 if updated_count % 10 == 0:
                     db.session.commit()
-                    time.sleep(0.1)
             
             db.session.commit()
         